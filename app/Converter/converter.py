@@ -1,26 +1,14 @@
-import spacy
 import csv
 import Converter.fct_utils as fct_utils
-from spacy.matcher import Matcher
-import pandas as pd
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from Converter.place_extractor import PlaceExtractor
+import threading
 import torch
 import os
 
-model_path = r"C:\Users\mmazl\Documents\AIA\target\fine-tuned-bert"
-tokenizer = AutoTokenizer.from_pretrained(model_path)
-model = AutoModelForSequenceClassification.from_pretrained(model_path)
-
-# Move the model to the appropriate device (GPU or CPU)
-device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
-model = model.to(device)
-
-spacy.prefer_gpu()
-# nlp = spacy.load('custom_spacy_model')#model custom
-nlp = spacy.load('fr_core_news_lg')#model fr_core_news_lg 
-
-
-dataset = '../../dataset.csv'
+# Les modèles (CamemBERT fine-tuné, fr_core_news_lg) sont chargés à la première utilisation
+# et partagés avec RecordTranscribe (voir model_registry.py)
+from model_registry import registry
+from micro_batch import MicroBatcher
 
 # Get the absolute path of the current script
 current_script_path = os.path.abspath(__file__)
@@ -37,13 +25,15 @@ sncf_dataset = os.path.join(current_script_dir, relative_sncf_dataset_path)
 communes_set = set()
 commune_to_stations = {}
 
-df = pd.read_csv('dataset.csv')
-
-df = df[['Sentence', 'Departure City', 'Arrival City', 'Trip Validity']]
-
-df['Validity Label'] = df['Trip Validity'].map({'VALID_TRIP': 1, 'INVALID_TRIP': 0})
+# Matchers des lieux compilés une seule fois (voir get_place_extractor)
+_place_extractor = None
+_place_extractor_lock = threading.Lock()
 
-df = df.dropna(subset=['Sentence', 'Validity Label'])
+# Regroupement des phrases à classer : taille maximale d'un lot et attente maximale pour le compléter
+CLASSIFIER_MAX_BATCH_SIZE = int(os.environ.get('TRIP_CLASSIFIER_MAX_BATCH_SIZE', 16))
+CLASSIFIER_MAX_WAIT_MS = float(os.environ.get('TRIP_CLASSIFIER_MAX_WAIT_MS', 5))
+_trip_classifier = None
+_trip_classifier_lock = threading.Lock()
 
 banned_vehicles = ["moto", "voiture", "scooter", "camion", "quad", "buggy", "chameau", "montgolfière", "trottinette", "vélo", "vélo électrique", "tapis volant", "hélicoptère", "avion", "bateau", "yacht", "sous-marin", "fusée", "vaisseau spatial"]
 
@@ -70,138 +60,52 @@ with open(sncf_dataset, 'r', encoding='utf-8') as sncf_file:
 
 #################################################################################### fonctions ############################
 
-def extraireLieux(phrase):
-    doc = nlp(phrase)
-
-    # --- 1) Build separate matchers for departure, arrival, and intermediate
-    departure_matcher = Matcher(nlp.vocab)
-    arrival_matcher = Matcher(nlp.vocab)
-    intermediate_matcher = Matcher(nlp.vocab)
-
-    # --- 2) Define multiple patterns for departure
-    # Pattern A: "depuis|de + <LOC>"
-    dep_pattern_a = [
-        {"LOWER": {"IN": ["depuis", "de"]}},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-    # Pattern B: "je suis|je me trouve|je suis actuellement à <LOC>"
-    #  - We'll allow optional words in between, e.g. "je suis actuellement à"
-    dep_pattern_b = [
-        {"LEMMA": {"IN": ["être"]}},
-        {"LOWER": {"IN": ["actuellement"]}, "OP": "*"},
-        {"LOWER": {"IN": ["à", "au", "en"]}},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-
-    dep_pattern_c = [
-        {"LOWER": {"REGEX": r"^(me|se)$"}},
-        {"LEMMA": {"IN": ["trouver"]}},
-        {"LOWER": {"IN": ["à"]}},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-
-    dep_pattern_d = [
-        {"LEMMA": {"IN": ["partir", "voyager"]}},
-        {"LOWER": {"IN": ["de", "depuis"]}},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-
-    dep_pattern_e = [
-        {"LEMMA": {"IN": ["quitter"]}},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-
-    # Add them to the departure_matcher
-    departure_matcher.add("DEPARTURE_PATTERN", [dep_pattern_b, dep_pattern_c, dep_pattern_a, dep_pattern_e, dep_pattern_d])
-
-    # --- 3) Define multiple patterns for arrival
-    # Pattern A: "aller|rendre|rejoindre|vouloir + à|pour|vers|en + <LOC>"
-
-    arr_pattern_a = [
-        {"LOWER": {"IN": ["pour", "afin"]}, "OP": "*"},
-        {"LOWER": {"REGEX": r"^(me|te|se|m’|t’|s’)$"}, "OP": "*"},
-        {"LEMMA": {"IN": ["aller", "arriver", "rendre", "rejoindre", "vouloir", "souhaiter"]}, "OP": "+"},
-        {"OP": "*"},
-        {"LOWER": {"IN": ["à", "pour", "vers", "en"]}, "OP": "+"},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-    # Pattern B: "pour + <LOC>"
-    arr_pattern_b = [
-        {"LOWER": {"IN": ["pour", "vers", "à", "en"]}},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-
-    arr_pattern_c = [
-        {"LEMMA": {"IN": ["voyager"]}, "OP": "+"},
-        {"LOWER": {"IN": ["à", "vers"]}, "OP": "+"},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-    # Add them to the arrival_matcher
-    arrival_matcher.add("ARRIVAL_PATTERN", [arr_pattern_a, arr_pattern_b, arr_pattern_c])
-
-    # --- 4) Define patterns for intermediate locations
-    # "en passant par <LOC>", "via <LOC>", "par <LOC>"
-    inter_pattern_a = [
-        {"LOWER": {"IN": ["par", "via"]}, "OP": "+"},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-    inter_pattern_b = [
-        {"LOWER": "passant"},
-        {"LOWER": "par"},
-        {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
-    ]
-    intermediate_matcher.add("INTER_PATTERN", [inter_pattern_a, inter_pattern_b])
-
-    # --- 5) Apply matchers to doc
-    dep_matches = departure_matcher(doc)
-    arr_matches = arrival_matcher(doc)
-    inter_matches = intermediate_matcher(doc)
-
-    # Sort by start index so we read from left to right
-    dep_matches = sorted(dep_matches, key=lambda x: x[1])
-    arr_matches = sorted(arr_matches, key=lambda x: x[1])
-    inter_matches = sorted(inter_matches, key=lambda x: x[1])
-
-    lieu_depart = None
-    lieu_arrivee = None
-    lieux_intermediaires = []
-
-    # --- 6) Extract departure from the earliest departure match
-    if dep_matches:
-        _, start, end = dep_matches[0]
-        span = doc[start:end]
-        # Check for recognized entity
-        for ent in span.ents:
-            if ent.label_ in ["LOC", "GPE"]:
-                lieu_depart = ent.text
-                break
-
-    # --- 7) Extract arrival from the *last* arrival match
-    # (or the first, depending on your logic)
-    if arr_matches:
-        _, start, end = arr_matches[-1]
-        span = doc[start:end]
-        for ent in span.ents:
-            if ent.label_ in ["LOC", "GPE"]:
-                lieu_arrivee = ent.text
-                break
-
-    # --- 8) Extract intermediates
-    if inter_matches:
-        for _, start, end in inter_matches:
-            span = doc[start:end]
-            for ent in span.ents:
-                if ent.label_ in ["LOC", "GPE"]:
-                    lieux_intermediaires.append(ent.text)
-
-    # --- 9) Return your final result
+def get_place_extractor():
+    """Extracteur de lieux (voir place_extractor.py), compilé au premier appel puis réutilisé."""
+    global _place_extractor
+    if _place_extractor is None:
+        with _place_extractor_lock:
+            if _place_extractor is None:
+                _place_extractor = PlaceExtractor(registry.get('nlp'))
+    return _place_extractor
+
+
+def analyserPhrase(phrase):
+    """
+    Analyse spaCy unique d'une phrase : le Doc obtenu est passé à toutes les étapes
+    (is_banned_vehicle, extraireLieux, analyserLieuxActions) au lieu de réanalyser le texte.
+    """
+    return registry.get('nlp')(phrase)
+
+
+def _as_doc(phrase_or_doc):
+    # Les étapes acceptent encore une chaîne (analysée à la volée) pour les appels existants
+    return analyserPhrase(phrase_or_doc) if isinstance(phrase_or_doc, str) else phrase_or_doc
+
+
+def extraireLieux(phrase_or_doc):
+    doc = _as_doc(phrase_or_doc)
+    lieu_depart, lieu_arrivee, lieux_intermediaires = get_place_extractor().extract(doc)
     return [], lieu_depart, lieu_arrivee, lieux_intermediaires
 
 
+def analyserLieuxActions(phrase_or_doc):
+    """Lieux reconnus (entités LOC / GPE) et verbes principaux d'une phrase."""
+    doc = _as_doc(phrase_or_doc)
+    locations = [ent.text for ent in doc.ents if ent.label_ in ['GPE', 'LOC']]
+    actions = [token.text for token in doc if token.pos_ == "VERB" and token.dep_ == "ROOT"]
+    return locations, actions
 
-def estTrajet(phrase):
+
+
+def classerPhrases(phrases):
+    """
+    Classe un lot de phrases en une seule passe avant du classifieur (phrases complétées par du padding
+    à la plus longue du lot) ; retourne "1" (trajet) ou "0" (pas un trajet) pour chaque phrase, dans l'ordre.
+    """
+    tokenizer, model, device = registry.get('classifier')
     inputs = tokenizer(
-        phrase,
+        list(phrases),
         return_tensors='pt',
         truncation=True,
         padding=True,
@@ -212,37 +116,56 @@ def estTrajet(phrase):
     with torch.no_grad():
         outputs = model(**inputs)
 
-    logits = outputs.logits
-    predicted_class_id = logits.argmax(-1).item()
+    predicted_class_ids = outputs.logits.argmax(-1).tolist()
 
     class_labels = ['Invalid', 'Valid']
-    predicted_label = class_labels[predicted_class_id]
-    if (predicted_label == 'Invalid'):
-        return "0"
-    else:
-        return "1"
-    
-def is_banned_vehicle(phrase):
-    doc = nlp(phrase.lower())
+    return ["0" if class_labels[class_id] == 'Invalid' else "1" for class_id in predicted_class_ids]
+
+
+def get_trip_classifier():
+    """
+    Micro-batching du classifieur (voir micro_batch.py) : les phrases des requêtes concurrentes
+    sont regroupées en lots pour classerPhrases. Créé au premier appel puis réutilisé.
+    """
+    global _trip_classifier
+    if _trip_classifier is None:
+        with _trip_classifier_lock:
+            if _trip_classifier is None:
+                _trip_classifier = MicroBatcher(
+                    classerPhrases, max_batch_size=CLASSIFIER_MAX_BATCH_SIZE, max_wait_ms=CLASSIFIER_MAX_WAIT_MS)
+    return _trip_classifier
+
+
+def estTrajet(phrase):
+    """Classe une phrase ("1" trajet, "0" sinon) ; elle est regroupée avec celles des requêtes concurrentes."""
+    return get_trip_classifier()(phrase)
+
+
+def is_banned_vehicle(phrase_or_doc):
+    doc = _as_doc(phrase_or_doc)
     for token in doc:
         # Vérifier si le token est un nom commun
         if token.pos_ == "NOUN":
-            # Normaliser le mot en enlevant les accents et en le mettant en minuscule
-            vehicle = token.lemma_.lower()
-            if vehicle in banned_vehicles:
+            # Comparaison en minuscules via les attributs du token, sans réanalyser le texte en minuscules
+            if token.lemma_.lower() in banned_vehicles or token.lower_ in banned_vehicles:
                 return 1
     return 0
 
 
-def processPhrases(phrase):
-    
+def processPhrases(phrase, doc=None):
+    """
+    `doc` : analyse spaCy de `phrase` déjà faite (ex : par transcribe_and_analyze) ;
+    sinon la phrase est analysée une seule fois ici, après le classifieur.
+    """
     if (estTrajet(phrase) == "0"):
         print(f"Phrase: {phrase} is a INVALID trip, [NOT A TRIP]\n")
         return 
-    if is_banned_vehicle(phrase) == 1:
+    if doc is None:
+        doc = analyserPhrase(phrase)
+    if is_banned_vehicle(doc) == 1:
         return
 
-    verbe, lieu_depart_raw, lieu_arrivee_raw, lieux_intermediaires_raw = extraireLieux(phrase)
+    verbe, lieu_depart_raw, lieu_arrivee_raw, lieux_intermediaires_raw = extraireLieux(doc)
     lieu_depart = fct_utils.normalize_str(lieu_depart_raw) if lieu_depart_raw else None
     lieu_arrivee = fct_utils.normalize_str(lieu_arrivee_raw) if lieu_arrivee_raw else None
     lieux_intermediaires = [fct_utils.normalize_str(city) for city in lieux_intermediaires_raw] if lieux_intermediaires_raw else []
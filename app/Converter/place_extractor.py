@@ -0,0 +1,215 @@
+import ast
+import json
+import os
+import threading
+
+from spacy.matcher import Matcher
+
+# Motifs spaCy des lieux de départ, d'arrivée et intermédiaires
+PATTERNS_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patterns.json')
+
+# Listes d'expressions (expressions_depart, expressions_arrivee...) référencées par le fichier de motifs
+CONST_UTILS_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../const_utils.py')
+
+# Motifs supplémentaires tirés des listes d'expressions de const_utils.py : désactivés par défaut,
+# car des expressions génériques ("de", "pour", "vers") changent les lieux extraits
+USE_EXPRESSIONS = os.environ.get('PLACE_EXTRACTOR_EXPRESSIONS', '0') == '1'
+
+# Jeton lieu qui termine chaque motif construit depuis une expression
+LOCATION_TOKEN = {"ENT_TYPE": {"IN": ["LOC", "GPE"]}, "OP": "+"}
+
+ROLES = ("departure", "arrival", "intermediate")
+
+
+def read_expression_lists(filename):
+    """
+    {nom: liste} des listes littérales affectées au niveau du module dans `filename`
+    (ex : expressions_depart de const_utils.py), lues avec ast sans exécuter le fichier.
+    """
+    with open(filename, mode='r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=filename)
+    lists = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.List):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    lists[target.id] = ast.literal_eval(node.value)
+    return lists
+
+
+def compile_matchers(vocab, patterns):
+    """Un Matcher par rôle (départ, arrivée, étapes) à partir de patterns[rôle] = [motif, ...]."""
+    matchers = {}
+    for role in ROLES:
+        matcher = Matcher(vocab)
+        if patterns.get(role):
+            matcher.add(role.upper() + "_PATTERN", patterns[role])
+        matchers[role] = matcher
+    return matchers
+
+
+class PlaceExtractor:
+    """
+    Matchers des lieux de départ, d'arrivée et intermédiaires, compilés une seule fois pour le
+    vocabulaire de `nlp` à partir du fichier de motifs (patterns.json) : les motifs spaCy écrits
+    à la main de l'ancien extraireLieux. Avec `use_expressions` (PLACE_EXTRACTOR_EXPRESSIONS=1),
+    un motif "<expression> <LIEU>" est ajouté par expression des listes de const_utils.py
+    référencées par le fichier ; les lieux extraits peuvent alors changer (voir main).
+    Les fichiers sont relus automatiquement quand ils changent (voir reload_if_changed).
+    """
+
+    def __init__(self, nlp, patterns_filename=PATTERNS_FILENAME, const_utils_filename=CONST_UTILS_FILENAME,
+                 use_expressions=USE_EXPRESSIONS):
+        self.nlp = nlp
+        self.patterns_filename = patterns_filename
+        self.const_utils_filename = const_utils_filename
+        self.use_expressions = use_expressions
+        self._mtimes = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _current_mtimes(self):
+        filenames = [self.patterns_filename]
+        if self.use_expressions:
+            filenames.append(self.const_utils_filename)
+        return tuple(os.stat(filename).st_mtime if os.path.exists(filename) else None for filename in filenames)
+
+    def reload(self):
+        """Relit les fichiers et recompile les trois Matchers."""
+        mtimes = self._current_mtimes()
+        with open(self.patterns_filename, mode='r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        patterns = {role: list(config.get(role, [])) for role in ROLES}
+        expression_lists = config.get('expressions', {}) if self.use_expressions else {}
+        if expression_lists:
+            constants = read_expression_lists(self.const_utils_filename)
+            for role, list_name in expression_lists.items():
+                for expression in constants[list_name]:
+                    tokens = [{"LOWER": token.lower_} for token in self.nlp.make_doc(expression)]
+                    if tokens:
+                        patterns[role].append(tokens + [LOCATION_TOKEN])
+
+        # Remplacement en une fois : une extraction en cours garde les anciens Matchers
+        self.matchers = compile_matchers(self.nlp.vocab, patterns)
+        self.pattern_counts = {role: len(patterns[role]) for role in ROLES}
+        self._mtimes = mtimes
+
+    def reload_if_changed(self):
+        """
+        Recompile si le fichier de motifs (ou const_utils.py, avec use_expressions) a été modifié
+        depuis le dernier chargement. Si la relecture échoue (fichier invalide, en cours d'écriture...),
+        l'erreur est affichée et les Matchers précédents restent en service jusqu'à la modification suivante.
+        """
+        if self._current_mtimes() != self._mtimes:
+            with self._lock:
+                mtimes = self._current_mtimes()
+                if mtimes != self._mtimes:
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        print(f"Motifs non rechargés ({self.patterns_filename}) : {type(e).__name__}: {e}")
+                        self._mtimes = mtimes
+
+    @staticmethod
+    def _first_location(span):
+        for ent in span.ents:
+            if ent.label_ in ["LOC", "GPE"]:
+                return ent.text
+        return None
+
+    def extract(self, doc):
+        """
+        Retourne (lieu_depart, lieu_arrivee, lieux_intermediaires) pour un Doc déjà analysé :
+        départ de la première correspondance, arrivée de la dernière, toutes les étapes.
+        """
+        self.reload_if_changed()
+        matchers = self.matchers
+
+        # Sort by start index so we read from left to right
+        dep_matches = sorted(matchers["departure"](doc), key=lambda x: x[1])
+        arr_matches = sorted(matchers["arrival"](doc), key=lambda x: x[1])
+        inter_matches = sorted(matchers["intermediate"](doc), key=lambda x: x[1])
+
+        lieu_depart = None
+        lieu_arrivee = None
+        lieux_intermediaires = []
+
+        if dep_matches:
+            _, start, end = dep_matches[0]
+            lieu_depart = self._first_location(doc[start:end])
+
+        if arr_matches:
+            _, start, end = arr_matches[-1]
+            lieu_arrivee = self._first_location(doc[start:end])
+
+        for _, start, end in inter_matches:
+            for ent in doc[start:end].ents:
+                if ent.label_ in ["LOC", "GPE"]:
+                    lieux_intermediaires.append(ent.text)
+
+        return lieu_depart, lieu_arrivee, lieux_intermediaires
+
+
+# Phrases annotées (Sentence, Departure City, Arrival City...) pour comparer les extractions
+DATASET_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../dataset.csv')
+
+
+def main():
+    # 1) Coût d'extraction par phrase : Matchers des motifs écrits à la main reconstruits à chaque appel
+    #    (ancien extraireLieux) ou extracteur compilé une fois. Les phrases sont analysées à l'avance
+    #    pour ne mesurer que l'extraction.
+    # 2) Phrases de dataset.csv dont l'extraction change si l'on active les expressions de const_utils
+    import csv
+    import sys
+    import time
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from model_registry import registry
+
+    nlp = registry.get('nlp')
+    phrases = [
+        "Je voudrais aller de Strasbourg à Saverne.",
+        "Je suis actuellement à Lyon et je veux rejoindre Marseille en passant par Avignon.",
+        "Comment me rendre à Nancy depuis Metz ?",
+        "Je quitte Lille pour Amiens via Arras.",
+    ]
+    docs = [nlp(phrase) for phrase in phrases]
+    repeat = 50
+
+    with open(PATTERNS_FILENAME, mode='r', encoding='utf-8') as f:
+        handwritten = {role: pattern for role, pattern in json.load(f).items() if role in ROLES}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for doc in docs:
+            for matcher in compile_matchers(nlp.vocab, handwritten).values():
+                matcher(doc)
+    before_ms = (time.perf_counter() - start) * 1000 / (repeat * len(docs))
+
+    extractor = PlaceExtractor(nlp, use_expressions=False)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for doc in docs:
+            extractor.extract(doc)
+    after_ms = (time.perf_counter() - start) * 1000 / (repeat * len(docs))
+
+    print(f"Motifs : {extractor.pattern_counts}")
+    print(f"Matchers reconstruits à chaque phrase : {before_ms:.3f} ms / phrase")
+    print(f"Matchers compilés une fois           : {after_ms:.3f} ms / phrase")
+
+    with_expressions = PlaceExtractor(nlp, use_expressions=True)
+    print(f"Motifs avec les expressions : {with_expressions.pattern_counts}")
+    with open(DATASET_FILENAME, mode='r', encoding='utf-8', newline='') as f:
+        sentences = [row['Sentence'] for row in csv.DictReader(f)]
+    changed = 0
+    for sentence in sentences:
+        doc = nlp(sentence)
+        before, after = extractor.extract(doc), with_expressions.extract(doc)
+        if before != after:
+            changed += 1
+            print(f"{sentence}\n  sans expressions : {before}\n  avec expressions : {after}")
+    print(f"{changed} / {len(sentences)} phrases de dataset.csv changent avec les expressions")
+
+
+if __name__ == "__main__":
+    main()
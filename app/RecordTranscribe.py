@@ -1,11 +1,10 @@
 import numpy as np
 from scipy.io.wavfile import write
-from faster_whisper import WhisperModel
 import sounddevice as sd
-import spacy
 
-# Initialisez le modèle NLP une seule fois
-nlp = spacy.load("fr_core_news_lg")
+# Whisper et fr_core_news_lg viennent du registre partagé avec Converter (voir model_registry.py)
+from model_registry import registry
+from Converter.converter import analyserPhrase, analyserLieuxActions
 
 # Variables pour l'enregistrement
 freq = 44100
@@ -48,8 +47,8 @@ def transcribe_and_analyze(audio_file):
     """
     Effectue la transcription d'un fichier audio ou vidéo, analyse le texte et retourne les informations pertinentes.
     """
-    # Chargez le modèle Whisper
-    model = WhisperModel("medium", device="CPU", compute_type="int8")
+    # Modèle Whisper (chargé une seule fois par processus)
+    model = registry.get('whisper')
     
     # Transcrivez le fichier audio
     segments, info = model.transcribe(audio_file, beam_size=5, language="fr")
@@ -58,14 +57,14 @@ def transcribe_and_analyze(audio_file):
     print(f"Detected language: {info.language} with probability {info.language_probability}")
     print("Transcription:", transcription)
 
-    # Analyse NLP
-    doc = nlp(transcription)
-    locations = [ent.text for ent in doc.ents if ent.label_ in ['GPE', 'LOC']]
-    actions = [token.text for token in doc if token.pos_ == "VERB" and token.dep_ == "ROOT"]
+    # Analyse NLP, faite une seule fois : le Doc est renvoyé pour être réutilisé par processPhrases
+    doc = analyserPhrase(transcription)
+    locations, actions = analyserLieuxActions(doc)
 
     return {
         "transcription": transcription,
         "language": info.language,
         "locations": locations,
-        "actions": actions
+        "actions": actions,
+        "doc": doc
     }
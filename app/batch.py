@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from itinéraireTrain import itineraireTrain
+from timetable import get_timetable, reload_timetable, STOPS_FILENAME, STOP_TIMES_FILENAME
+
+# Nombre de trajets envoyés à la fois à un worker
+DEFAULT_CHUNKSIZE = 16
+
+# Nombre de workers du pool, surchargeable par variable d'environnement
+DEFAULT_MAX_WORKERS = int(os.environ.get('TRIP_BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Pool de workers du processus (voir start_pool)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(stops_filename, stop_times_filename):
+    # Avec fork, le Timetable du parent est déjà là (pages partagées en copie sur écriture) ;
+    # sinon (forkserver, spawn), chaque worker l'ouvre depuis le snapshot mappé
+    get_timetable(stops_filename, stop_times_filename)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _route_one(item):
+    """Calcule un trajet dans un worker ; les erreurs sont renvoyées dans le résultat."""
+    try:
+        feed_version, departure_name, arrival_name, current_date, current_time_sec, *rest = item
+        intermediate_names = rest[0] if rest else None
+        timetable = get_timetable()
+        # Le pool survit aux rechargements du flux (/timetable/reload) : le worker se met à jour
+        # à la première demande sur une nouvelle version
+        if timetable.feed_version != feed_version:
+            timetable = reload_timetable()
+        path_names, duree_str, next_dep_time = itineraireTrain(
+            timetable.stops_filename,
+            timetable.stop_times_filename,
+            departure_name.lower(),
+            arrival_name.lower(),
+            current_date,
+            current_time_sec,
+            intermediate_names,
+            timetable=timetable
+        )
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    if path_names is None:
+        return {"error": "Aucun itinéraire trouvé."}
+    return {
+        "itineraire": " -> ".join(path_names),
+        "duree": duree_str,
+        "next_dep_time": next_dep_time
+    }
+
+
+def start_pool(max_workers=DEFAULT_MAX_WORKERS, stops_filename=STOPS_FILENAME, stop_times_filename=STOP_TIMES_FILENAME):
+    """
+    Crée le pool de workers du processus s'il n'existe pas (ou plus, voir route_batch)
+    et démarre tous ses workers.
+
+    Sous Linux les workers sont créés par fork s'il n'y a encore qu'un thread : à appeler au démarrage,
+    une fois le Timetable chargé et avant tout autre thread (préchauffage des modèles, serveur Flask,
+    micro-batching). Un fork depuis un processus multi-thread peut copier un verrou tenu par un autre
+    thread (_timetable_lock, stdout...) et bloquer le worker pour toujours : un pool recréé plus tard
+    passe donc par forkserver (ou spawn), dont les workers rouvrent le snapshot. Ces workers réimportent
+    le script principal sous le nom __mp_main__, qui ne doit alors rien démarrer (voir main.py).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            get_timetable(stops_filename, stop_times_filename)
+            start_methods = multiprocessing.get_all_start_methods()
+            if 'fork' in start_methods and threading.active_count() == 1:
+                mp_context = multiprocessing.get_context('fork')
+            elif 'forkserver' in start_methods:
+                mp_context = multiprocessing.get_context('forkserver')
+            else:
+                mp_context = multiprocessing.get_context('spawn')
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context, initializer=_init_worker,
+                                       initargs=(stops_filename, stop_times_filename))
+            # Avec fork, la première tâche lance tous les workers : ils sont créés ici, pas pendant une requête
+            # (forkserver et spawn les lancent à la demande)
+            pool.submit(_ready).result()
+            _pool = pool
+        return _pool
+
+
+def route_batch(items, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Calcule de nombreux trajets en parallèle sur le pool de workers (voir start_pool,
+    appelé ici s'il ne l'a pas été au démarrage).
+    `items` : tuples (departure_name, arrival_name, current_date, current_time_sec[, intermediate_names]).
+    Générateur : les résultats (dictionnaires comme la réponse de /trips, ou {"error": ...})
+    arrivent dans l'ordre de `items`, au fur et à mesure des calculs.
+    Si le pool est hors service (worker tué), il est abandonné pour être recréé à l'appel suivant,
+    et les trajets restants sont calculés dans ce processus.
+    """
+    global _pool
+    pool = start_pool()
+    feed_version = get_timetable().feed_version
+    items = [(feed_version,) + tuple(item) for item in items]
+
+    done = 0
+    try:
+        for result in pool.map(_route_one, items, chunksize=chunksize):
+            done += 1
+            yield result
+    except BrokenProcessPool:
+        with _pool_lock:
+            # Un autre appel a pu le remplacer entre-temps
+            if _pool is pool:
+                _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        for item in items[done:]:
+            yield _route_one(item)
+
+
+def main():
+    # Exemple : quelques trajets calculés en parallèle
+    import time
+    from datetime import datetime
+
+    now = datetime.now()
+    current_date = now.date()
+    current_time_sec = now.hour * 3600 + now.minute * 60 + now.second
+    pairs = [("Strasbourg", "Saverne"), ("Nancy", "Metz"), ("Lille", "Amiens"), ("Inconnue", "Metz")]
+
+    start_pool()
+    start = time.perf_counter()
+    items = [(departure, arrival, current_date, current_time_sec) for departure, arrival in pairs]
+    for (departure, arrival), result in zip(pairs, route_batch(items)):
+        print(f"{departure} -> {arrival} : {result}")
+    print(f"{len(items)} trajets en {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import csv
+import os
+from datetime import datetime, timedelta
+
+from gtfs_source import open_gtfs
+
+
+def parse_gtfs_date(yyyymmdd):
+    """Convertit une date GTFS 'YYYYMMDD' en datetime.date."""
+    return datetime.strptime(yyyymmdd, "%Y%m%d").date()
+
+
+class ServiceCalendar:
+    """
+    Calendrier de circulation tiré de calendar_dates.txt et trips.txt :
+    chaque service_id a un bitset (entier Python) sur la fenêtre du flux (feed_info.txt),
+    le bit i valant 1 si le service circule le jour feed_start_date + i.
+    "Ce trip circule-t-il le jour D ?" devient un test de bit, sans analyse de chaîne.
+    """
+
+    def __init__(self, gtfs_dir):
+        with open_gtfs(os.path.join(gtfs_dir, 'feed_info.txt')) as f:
+            feed_info = next(csv.DictReader(f))
+        self.start_date = parse_gtfs_date(feed_info['feed_start_date'])
+        self.end_date = parse_gtfs_date(feed_info['feed_end_date'])
+        self.n_days = (self.end_date - self.start_date).days + 1
+
+        # Les dates sont converties une seule fois (quelques centaines de valeurs distinctes)
+        day_offsets = {}
+        self.service_bits = {}
+        with open_gtfs(os.path.join(gtfs_dir, 'calendar_dates.txt')) as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                date_str = row['date']
+                if date_str not in day_offsets:
+                    day_offsets[date_str] = (parse_gtfs_date(date_str) - self.start_date).days
+                day = day_offsets[date_str]
+                if not 0 <= day < self.n_days:
+                    continue
+
+                service_id = row['service_id']
+                bits = self.service_bits.get(service_id, 0)
+                if row['exception_type'] == '1':
+                    bits |= 1 << day       # service ajouté ce jour
+                else:
+                    bits &= ~(1 << day)    # service supprimé ce jour
+                self.service_bits[service_id] = bits
+
+        self.trip_service = {}
+        with open_gtfs(os.path.join(gtfs_dir, 'trips.txt')) as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                self.trip_service[row['trip_id']] = row['service_id']
+
+        self._active_trips = {}
+
+    def day_offset(self, date):
+        """Indice du jour `date` dans la fenêtre du flux, ou None s'il est hors fenêtre."""
+        day = (date - self.start_date).days
+        return day if 0 <= day < self.n_days else None
+
+    def runs(self, trip_id, date):
+        """Vrai si `trip_id` circule le jour `date`."""
+        day = self.day_offset(date)
+        if day is None:
+            return False
+        return (self.service_bits.get(self.trip_service.get(trip_id), 0) >> day) & 1 == 1
+
+    def active_trips(self, date):
+        """
+        Ensemble des trip_id circulant le jour `date` (calculé une fois par date),
+        à passer en `active_trips` aux moteurs RAPTOR / CSA.
+        """
+        trips = self._active_trips.get(date)
+        if trips is None:
+            day = self.day_offset(date)
+            if day is None:
+                trips = frozenset()
+            else:
+                mask = 1 << day
+                active_services = {s for s, bits in self.service_bits.items() if bits & mask}
+                trips = frozenset(t for t, s in self.trip_service.items() if s in active_services)
+            self._active_trips[date] = trips
+        return trips
+
+    def dates_from(self, date):
+        """Jours de la fenêtre du flux à partir de `date` inclus."""
+        day = max((date - self.start_date).days, 0)
+        for i in range(day, self.n_days):
+            yield self.start_date + timedelta(days=i)
@@ -0,0 +1,232 @@
+import csv
+import os
+from array import array
+from collections.abc import Mapping
+from itertools import islice
+from operator import itemgetter
+
+import numpy as np
+
+from gtfs_source import open_gtfs
+from interning import Interner
+
+# Valeur utilisée dans arr / dep quand l'horaire est absent
+NO_TIME = -1
+
+# Valeur utilisée dans pickup / drop_off quand la cellule est vide ou la colonne absente
+NO_TYPE = -1
+
+# Nombre de lignes de stop_times.txt converties en colonnes à la fois
+CHUNK_ROWS = 16384
+
+
+def parse_times(values):
+    """
+    Version vectorisée de itinéraireTrain.parse_time : convertit un tableau de chaînes 'HH:MM:SS'
+    (ou 'H:MM:SS') en secondes depuis minuit (int32), NO_TIME pour les chaînes vides.
+    """
+    values = np.asarray(values, dtype='S8')
+    empty = np.char.str_len(values) == 0
+    raw = np.char.rjust(values, 8, b'0')
+    digits = raw.view(np.uint8).reshape(-1, 8).astype(np.int32) - ord('0')
+    separators = digits[:, [2, 5]]
+    if np.any(separators[~empty] != ord(':') - ord('0')):
+        raise ValueError("Horaire mal formé dans stop_times.txt (attendu HH:MM:SS).")
+    seconds = ((digits[:, 0] * 10 + digits[:, 1]) * 3600
+               + (digits[:, 3] * 10 + digits[:, 4]) * 60
+               + digits[:, 6] * 10 + digits[:, 7])
+    seconds[empty] = NO_TIME
+    return seconds
+
+
+def format_time(seconds):
+    """Inverse de parse_times pour une valeur : 'HH:MM:SS', ou '' pour NO_TIME."""
+    if seconds == NO_TIME:
+        return ''
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_types(values):
+    """
+    Convertit un tableau de chaînes pickup_type / drop_off_type ('0' à '3') en int8,
+    NO_TYPE pour les chaînes vides.
+    """
+    values = np.asarray(values, dtype='S1')
+    types = values.view(np.uint8).astype(np.int8) - ord('0')
+    types[values == b''] = NO_TYPE
+    return types
+
+
+class StopTimes:
+    """
+    stop_times.txt en colonnes NumPy triées par (trip, stop_sequence) :
+      - trips / stops : identifiants internés (voir interning.Interner), les colonnes trip et stop
+        en sont les indices
+      - trip, stop, seq, arr, dep : une entrée par ligne (arr / dep en secondes, NO_TIME si absent)
+      - pickup, drop_off : pickup_type / drop_off_type (int8, NO_TYPE si absent)
+      - trip_offsets : les lignes du trip t sont [trip_offsets[t], trip_offsets[t + 1])
+    """
+
+    def __init__(self, trips, stops, trip, stop, seq, arr, dep, pickup=None, drop_off=None):
+        self.trips = trips
+        self.stops = stops
+        self.trip = trip
+        self.stop = stop
+        self.seq = seq
+        self.arr = arr
+        self.dep = dep
+        self.pickup = pickup if pickup is not None else np.full(len(trip), NO_TYPE, dtype=np.int8)
+        self.drop_off = drop_off if drop_off is not None else np.full(len(trip), NO_TYPE, dtype=np.int8)
+        self.trip_offsets = np.zeros(len(trips) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(trip, minlength=len(trips)), out=self.trip_offsets[1:])
+
+    @property
+    def trip_ids(self):
+        return self.trips.ids
+
+    @property
+    def stop_ids(self):
+        return self.stops.ids
+
+    def __len__(self):
+        return len(self.trip)
+
+    def trip_stop_map(self):
+        """
+        Vue en lecture seule au format de itinéraireTrain.read_stop_times (voir TripStopMap),
+        sans recopier les horaires en tuples Python.
+        """
+        return TripStopMap(self)
+
+    def to_trip_stop_map(self):
+        """
+        Même structure que itinéraireTrain.read_stop_times, entièrement matérialisée :
+          trip_stop_map[trip_id] = [(stop_id, stop_sequence, arr_sec, dep_sec), ...]
+        avec None pour les horaires absents.
+        """
+        return dict(self.trip_stop_map().items())
+
+
+class TripStopMap(Mapping):
+    """
+    trip_stop_map[trip_id] = [(stop_id, stop_sequence, arr_sec, dep_sec), ...] reconstruit
+    à la demande depuis les colonnes de StopTimes (tableaux compacts de 4 octets par valeur) :
+    les constructeurs de graphes et moteurs le lisent comme le dictionnaire de read_stop_times,
+    mais seuls les indices restent en mémoire.
+    """
+
+    __slots__ = ('trips', 'stop_ids', 'offsets', 'stop', 'seq', 'arr', 'dep')
+
+    def __init__(self, stop_times):
+        self.trips = stop_times.trips
+        self.stop_ids = stop_times.stops.ids
+        self.offsets = array('q', stop_times.trip_offsets.tolist())
+        self.stop = array('i', stop_times.stop.tolist())
+        self.seq = array('i', stop_times.seq.tolist())
+        self.arr = array('i', stop_times.arr.tolist())
+        self.dep = array('i', stop_times.dep.tolist())
+
+    def _rows(self, t):
+        start, end = self.offsets[t], self.offsets[t + 1]
+        stop_ids = self.stop_ids
+        return [
+            (stop_ids[stop], seq, None if arr == NO_TIME else arr, None if dep == NO_TIME else dep)
+            for stop, seq, arr, dep in zip(self.stop[start:end], self.seq[start:end],
+                                           self.arr[start:end], self.dep[start:end])
+        ]
+
+    def __getitem__(self, trip_id):
+        t = self.trips.get(trip_id)
+        if t is None:
+            raise KeyError(trip_id)
+        return self._rows(t)
+
+    def __iter__(self):
+        return iter(self.trips)
+
+    def __len__(self):
+        return len(self.trips)
+
+    def __contains__(self, trip_id):
+        return trip_id in self.trips
+
+
+def read_stop_times_columns(stop_times_filename):
+    """
+    Lit stop_times.txt en colonnes (voir StopTimes) : les cellules sont lues par csv.reader par blocs
+    de CHUNK_ROWS lignes, identifiants internés et horaires convertis par bloc (parse_times),
+    et un seul lexsort sur (trip, stop_sequence) remplace le tri de chaque trip.
+    """
+    trips = Interner()
+    stops = Interner()
+    chunks = []
+    with open_gtfs(stop_times_filename) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = ['trip_id', 'stop_id', 'stop_sequence', 'arrival_time', 'departure_time']
+        # pickup_type / drop_off_type sont facultatifs dans GTFS
+        type_columns = [name for name in ('pickup_type', 'drop_off_type') if name in header]
+        getter = itemgetter(*(header.index(name) for name in columns + type_columns))
+        # Lecture par blocs : seules les colonnes utiles d'un bloc sont gardées en chaînes
+        while True:
+            rows = list(map(getter, islice(reader, CHUNK_ROWS)))
+            if not rows:
+                break
+            trip_col, stop_col, seq_col, arr_col, dep_col, *type_cols = zip(*rows)
+            del rows
+            # Colonne absente : types vides (NO_TYPE)
+            types = dict(zip(type_columns, type_cols))
+            no_types = ('',) * len(trip_col)
+            chunks.append((
+                trips.intern_array(np.array(trip_col, dtype='S')),
+                stops.intern_array(np.array(stop_col, dtype='S')),
+                np.array(seq_col, dtype='S').astype(np.int32),
+                parse_times(arr_col),
+                parse_times(dep_col),
+                parse_types(types.get('pickup_type', no_types)),
+                parse_types(types.get('drop_off_type', no_types)),
+            ))
+
+    if chunks:
+        trip, stop, seq, arr, dep, pickup, drop_off = (np.concatenate(column) for column in zip(*chunks))
+    else:
+        trip = stop = seq = arr = dep = np.empty(0, dtype=np.int32)
+        pickup = drop_off = np.empty(0, dtype=np.int8)
+    del chunks
+
+    order = np.lexsort((seq, trip))
+    return StopTimes(trips, stops, trip[order], stop[order], seq[order], arr[order], dep[order],
+                     pickup[order], drop_off[order])
+
+
+def main():
+    # Comparaison du lecteur actuel (dictionnaires) et du lecteur en colonnes : temps et pic mémoire
+    import sys
+    import time
+    import tracemalloc
+    from itinéraireTrain import read_stop_times
+
+    gtfs_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '../dataSncf')
+    stop_times_filename = os.path.join(gtfs_dir, 'stop_times.txt')
+
+    def measure(label, load):
+        # Temps sans suivi mémoire (tracemalloc ralentit fortement les allocations), puis pic mémoire
+        start = time.perf_counter()
+        result = load()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        load()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label} : {elapsed:.2f} s, pic mémoire {peak / 1e6:.0f} Mo")
+        return result
+
+    trip_stop_map = measure("read_stop_times              ", lambda: read_stop_times(stop_times_filename))
+    columns = measure("read_stop_times_columns      ", lambda: read_stop_times_columns(stop_times_filename))
+    converted = measure("  + to_trip_stop_map         ", columns.to_trip_stop_map)
+    print(f"{len(columns)} lignes, {len(columns.trip_ids)} trips, {len(columns.stop_ids)} arrêts")
+    print("Structures identiques :", converted == dict(trip_stop_map))
+
+
+if __name__ == "__main__":
+    main()
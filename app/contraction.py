@@ -0,0 +1,362 @@
+import heapq
+import json
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from snapshot import new_build_dir, publish_dir, read_feed_version, StaleSnapshotError
+
+INF = float('inf')
+
+CH_FORMAT = 1
+CH_DIRNAME = 'ch'
+META_FILENAME = 'meta.json'
+ARRAY_NAMES = [
+    'stop_ids', 'rank',
+    'up_offsets', 'up_targets', 'up_weights', 'up_middles',
+    'down_offsets', 'down_targets', 'down_weights', 'down_middles',
+]
+
+# Nombre maximal d'arrêts visités par une recherche de témoin pendant la contraction
+WITNESS_SETTLE_LIMIT = 200
+
+
+def _witness_search(out_edges, source, excluded, max_cost):
+    """
+    Dijkstra limité depuis `source` sur le graphe restant, sans passer par `excluded`.
+    Retourne les distances trouvées (au plus max_cost).
+    """
+    dist = {source: 0}
+    heap = [(0, source)]
+    settled = 0
+    while heap and settled < WITNESS_SETTLE_LIMIT:
+        d, u = heapq.heappop(heap)
+        if d > dist.get(u, INF):
+            continue
+        if d > max_cost:
+            break
+        settled += 1
+        for v, (w, _) in out_edges[u].items():
+            if v == excluded:
+                continue
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+class ContractionHierarchy:
+    """
+    Hiérarchie de contraction (CH) sur le graphe des durées : les arrêts sont contractés un par un
+    (les moins importants d'abord) et des raccourcis préservent les plus courts chemins.
+    Une requête est un Dijkstra bidirectionnel qui ne monte que vers des arrêts de rang supérieur :
+    il visite quelques dizaines d'arrêts au lieu de plusieurs milliers.
+
+    Le graphe ascendant `up` contient les arcs u -> v avec rank[v] > rank[u] ; le graphe `down`
+    contient, pour chaque v, les arcs u -> v avec rank[u] > rank[v] (parcourus à l'envers depuis la cible).
+    `middles` vaut l'arrêt contourné par un raccourci, -1 pour un arc d'origine.
+    """
+
+    def __init__(self, stop_ids, rank, up, down, feed_version=None):
+        self.stop_ids = list(stop_ids)
+        self.stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.rank = rank
+        self.up_offsets, self.up_targets, self.up_weights, self.up_middles = up
+        self.down_offsets, self.down_targets, self.down_weights, self.down_middles = down
+        self.feed_version = feed_version
+
+    @classmethod
+    def build(cls, graph, feed_version=None):
+        """
+        Prétraitement à partir de graph[stop_id] = [(autre_stop_id, duree), ...].
+        Ordre de contraction : différence d'arcs (raccourcis ajoutés - arcs retirés) plus le nombre
+        de voisins déjà contractés, avec mise à jour paresseuse des priorités.
+        """
+        stop_index = {}
+        for stop_id, neighbors in graph.items():
+            stop_index.setdefault(stop_id, len(stop_index))
+            for neighbor, _ in neighbors:
+                stop_index.setdefault(neighbor, len(stop_index))
+        n = len(stop_index)
+
+        # Graphe restant : out_edges[u][v] = in_edges[v][u] = (durée, arrêt contourné)
+        out_edges = [dict() for _ in range(n)]
+        in_edges = [dict() for _ in range(n)]
+        for stop_id, neighbors in graph.items():
+            u = stop_index[stop_id]
+            for neighbor, duration in neighbors:
+                v = stop_index[neighbor]
+                if u != v and duration < out_edges[u].get(v, (INF, -1))[0]:
+                    out_edges[u][v] = (duration, -1)
+                    in_edges[v][u] = (duration, -1)
+        # Tous les arcs (d'origine et raccourcis), conservés après contraction
+        all_edges = {(u, v): edge for u in range(n) for v, edge in out_edges[u].items()}
+
+        contracted_neighbors = [0] * n
+
+        def shortcuts_for(u):
+            shortcuts = []
+            if not in_edges[u] or not out_edges[u]:
+                return shortcuts
+            max_out = max(w for w, _ in out_edges[u].values())
+            for x, (w_xu, _) in in_edges[u].items():
+                dist = _witness_search(out_edges, x, u, w_xu + max_out)
+                for y, (w_uy, _) in out_edges[u].items():
+                    if y == x:
+                        continue
+                    w = w_xu + w_uy
+                    if dist.get(y, INF) > w:
+                        shortcuts.append((x, y, w))
+            return shortcuts
+
+        def priority(u):
+            return (len(shortcuts_for(u)) - len(in_edges[u]) - len(out_edges[u])
+                    + contracted_neighbors[u])
+
+        heap = [(priority(u), u) for u in range(n)]
+        heapq.heapify(heap)
+        rank = np.zeros(n, dtype=np.int32)
+        order = 0
+        while heap:
+            _, u = heapq.heappop(heap)
+            # Mise à jour paresseuse : si la priorité a augmenté, u est remis dans le tas
+            current = priority(u)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, u))
+                continue
+
+            for x, y, w in shortcuts_for(u):
+                if w < out_edges[x].get(y, (INF, -1))[0]:
+                    out_edges[x][y] = (w, u)
+                    in_edges[y][x] = (w, u)
+                if w < all_edges.get((x, y), (INF, -1))[0]:
+                    all_edges[(x, y)] = (w, u)
+
+            for x in in_edges[u]:
+                del out_edges[x][u]
+                contracted_neighbors[x] += 1
+            for y in out_edges[u]:
+                del in_edges[y][u]
+                contracted_neighbors[y] += 1
+            out_edges[u] = {}
+            in_edges[u] = {}
+
+            rank[u] = order
+            order += 1
+
+        up = defaultdict(list)
+        down = defaultdict(list)
+        for (u, v), (w, middle) in all_edges.items():
+            if rank[v] > rank[u]:
+                up[u].append((v, w, middle))
+            else:
+                down[v].append((u, w, middle))
+
+        return cls(list(stop_index), rank, cls._to_csr(up, n), cls._to_csr(down, n), feed_version)
+
+    @staticmethod
+    def _to_csr(adjacency, n):
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        targets, weights, middles = [], [], []
+        for u in range(n):
+            for v, w, middle in adjacency.get(u, ()):
+                targets.append(v)
+                weights.append(w)
+                middles.append(middle)
+            offsets[u + 1] = len(targets)
+        return (offsets, np.array(targets, dtype=np.int32), np.array(weights, dtype=np.int32),
+                np.array(middles, dtype=np.int32))
+
+    def save(self, ch_dir):
+        """
+        Enregistre la hiérarchie en .npy + meta.json (même organisation que snapshot.py), dans un dossier
+        temporaire publié par renommage : une hiérarchie déjà mappée n'est jamais réécrite sur place.
+        """
+        build_dir = new_build_dir(ch_dir)
+        arrays = {
+            'stop_ids': np.array(self.stop_ids, dtype=str),
+            'rank': self.rank,
+            'up_offsets': self.up_offsets, 'up_targets': self.up_targets,
+            'up_weights': self.up_weights, 'up_middles': self.up_middles,
+            'down_offsets': self.down_offsets, 'down_targets': self.down_targets,
+            'down_weights': self.down_weights, 'down_middles': self.down_middles,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(build_dir, name + '.npy'), array)
+        with open(os.path.join(build_dir, META_FILENAME), mode='w', encoding='utf-8') as f:
+            json.dump({'format': CH_FORMAT, 'feed_version': self.feed_version,
+                       'n_stops': len(self.stop_ids), 'n_edges': len(self.up_targets) + len(self.down_targets)},
+                      f, indent=2)
+        publish_dir(build_dir, ch_dir)
+
+    @classmethod
+    def load(cls, ch_dir, gtfs_dir=None):
+        """
+        Ouvre une hiérarchie enregistrée par save (en mémoire mappée).
+        Lève StaleSnapshotError si elle ne correspond pas à la feed_version de `gtfs_dir`.
+        """
+        meta_filename = os.path.join(ch_dir, META_FILENAME)
+        if not os.path.exists(meta_filename):
+            raise FileNotFoundError(f"Hiérarchie introuvable ou incomplète : {ch_dir}")
+        with open(meta_filename, mode='r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') != CH_FORMAT:
+            raise StaleSnapshotError(f"Format de hiérarchie {meta.get('format')} non supporté.")
+        if gtfs_dir is not None and meta.get('feed_version') != read_feed_version(gtfs_dir):
+            raise StaleSnapshotError(f"Hiérarchie {meta.get('feed_version')} périmée.")
+
+        arrays = {name: np.load(os.path.join(ch_dir, name + '.npy'), mmap_mode='r') for name in ARRAY_NAMES}
+        up = tuple(arrays['up_' + k] for k in ('offsets', 'targets', 'weights', 'middles'))
+        down = tuple(arrays['down_' + k] for k in ('offsets', 'targets', 'weights', 'middles'))
+        return cls(arrays['stop_ids'].tolist(), arrays['rank'], up, down, meta.get('feed_version'))
+
+    def _upward_search(self, seeds, offsets, targets, weights):
+        """Dijkstra complet restreint aux arcs montants ; retourne (distances, parents)."""
+        dist = dict(seeds)
+        parent = {}
+        heap = [(d, u) for u, d in seeds.items()]
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            start, end = offsets[u], offsets[u + 1]
+            for v, w in zip(targets[start:end].tolist(), weights[start:end].tolist()):
+                nd = d + w
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return dist, parent
+
+    def query(self, sources, goal_stop_ids):
+        """
+        Plus court chemin multi-sources / multi-cibles, même contrat que csr_graph.CSRGraph.dijkstra :
+        `sources` : dict[stop_id -> coût initial].
+        Retourne (chemin, cout_total, source, cible) ou (None, inf, None, None) si pas trouvé.
+        """
+        forward_seeds = {}
+        for stop_id, cost in sources.items():
+            s = self.stop_index.get(stop_id)
+            if s is not None and cost < forward_seeds.get(s, INF):
+                forward_seeds[s] = cost
+        backward_seeds = {self.stop_index[g]: 0 for g in goal_stop_ids if g in self.stop_index}
+        if not forward_seeds or not backward_seeds:
+            return None, INF, None, None
+
+        # Les espaces de recherche montants sont petits : on les explore entièrement
+        forward_dist, forward_parent = self._upward_search(
+            forward_seeds, self.up_offsets, self.up_targets, self.up_weights)
+        backward_dist, backward_parent = self._upward_search(
+            backward_seeds, self.down_offsets, self.down_targets, self.down_weights)
+
+        best, meeting = INF, None
+        for u, d in forward_dist.items():
+            total = d + backward_dist.get(u, INF)
+            if total < best:
+                best, meeting = total, u
+        if meeting is None:
+            return None, INF, None, None
+
+        # Chemin dans la hiérarchie : source -> meeting (montant), meeting -> cible (descendant)
+        up_path = [meeting]
+        while up_path[-1] in forward_parent:
+            up_path.append(forward_parent[up_path[-1]])
+        up_path.reverse()
+        down_path = [meeting]
+        while down_path[-1] in backward_parent:
+            down_path.append(backward_parent[down_path[-1]])
+
+        ch_path = up_path + down_path[1:]
+        path = [ch_path[0]]
+        for u, v in zip(ch_path, ch_path[1:]):
+            path.extend(self._unpack(u, v))
+        stop_path = [self.stop_ids[i] for i in path]
+        return stop_path, best, stop_path[0], stop_path[-1]
+
+    def distance(self, departure_stop_id, arrival_stop_id):
+        """Durée (secondes) du plus court chemin entre deux arrêts, ou inf."""
+        _, cost, _, _ = self.query({departure_stop_id: 0}, [arrival_stop_id])
+        return cost
+
+    def _edge(self, u, v):
+        """(durée, arrêt contourné) de l'arc u -> v de la hiérarchie."""
+        if self.rank[v] > self.rank[u]:
+            offsets, targets, weights, middles, key, other = (
+                self.up_offsets, self.up_targets, self.up_weights, self.up_middles, u, v)
+        else:
+            offsets, targets, weights, middles, key, other = (
+                self.down_offsets, self.down_targets, self.down_weights, self.down_middles, v, u)
+        best = None
+        for i in range(offsets[key], offsets[key + 1]):
+            if targets[i] == other and (best is None or weights[i] < weights[best]):
+                best = i
+        return int(weights[best]), int(middles[best])
+
+    def _unpack(self, u, v):
+        """Déroule récursivement le raccourci u -> v ; retourne les arrêts après u jusqu'à v."""
+        _, middle = self._edge(u, v)
+        if middle == -1:
+            return [v]
+        return self._unpack(u, middle) + self._unpack(middle, v)
+
+
+def load_or_build_ch(graph, gtfs_dir, ch_dir=None):
+    """
+    Ouvre la hiérarchie enregistrée à côté du flux (dataSncf/ch), en la reconstruisant
+    et en l'enregistrant si elle est absente ou périmée.
+    """
+    if ch_dir is None:
+        ch_dir = os.path.join(gtfs_dir, CH_DIRNAME)
+    try:
+        return ContractionHierarchy.load(ch_dir, gtfs_dir)
+    except (FileNotFoundError, StaleSnapshotError):
+        ch = ContractionHierarchy.build(graph, read_feed_version(gtfs_dir))
+        ch.save(ch_dir)
+        return ContractionHierarchy.load(ch_dir, gtfs_dir)
+
+
+def main():
+    # Prétraitement puis comparaison avec dijkstra (itinéraireTrain) et CSRGraph.dijkstra
+    import random
+    import time
+    from itinéraireTrain import dijkstra
+    from timetable import get_timetable
+
+    timetable = get_timetable()
+    gtfs_dir = os.path.dirname(timetable.stops_filename)
+    ch_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(gtfs_dir, CH_DIRNAME)
+
+    start = time.perf_counter()
+    ch = ContractionHierarchy.build(timetable.graph, read_feed_version(gtfs_dir))
+    ch.save(ch_dir)
+    print(f"Prétraitement : {time.perf_counter() - start:.1f} s, "
+          f"{len(ch.up_targets) + len(ch.down_targets)} arcs (dont raccourcis)")
+    ch = ContractionHierarchy.load(ch_dir, gtfs_dir)
+
+    random.seed(0)
+    stop_ids = list(timetable.stops_dict)
+    pairs = [tuple(random.sample(stop_ids, 2)) for _ in range(200)]
+
+    timings = {}
+    results = {}
+    for label, search in [
+        ("dijkstra", lambda s, t: dijkstra(timetable.graph, s, t)[1]),
+        ("CSRGraph.dijkstra", lambda s, t: timetable.csr.dijkstra({s: 0}, [t])[1]),
+        ("CH", lambda s, t: ch.distance(s, t)),
+    ]:
+        start = time.perf_counter()
+        results[label] = [search(s, t) for s, t in pairs]
+        timings[label] = (time.perf_counter() - start) / len(pairs) * 1000
+
+    mismatches = sum(a != b for a, b in zip(results["dijkstra"], results["CH"]))
+    for label, ms in timings.items():
+        print(f"{label:<18} : {ms:.3f} ms / requête")
+    print(f"Écarts CH / dijkstra : {mismatches} sur {len(pairs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+from bisect import bisect_right
+from collections import defaultdict
+
+import numpy as np
+
+from raptor import Leg, Journey, MIN_TRANSFER_SEC
+
+INF = float('inf')
+
+# Nombre de connexions converties en listes Python à la fois pendant le parcours
+SCAN_CHUNK = 4096
+
+
+class ConnectionScan:
+    """
+    Moteur CSA (Connection Scan Algorithm) : chaque paire d'arrêts consécutifs de chaque trip
+    devient une connexion (arrêt de départ, arrêt d'arrivée, heure de départ, heure d'arrivée, trip).
+    Les connexions sont triées par heure de départ et stockées en colonnes NumPy ;
+    une requête d'arrivée au plus tôt est un unique parcours linéaire qui s'arrête dès que
+    les départs suivants sont postérieurs à la meilleure arrivée trouvée.
+    """
+
+    def __init__(self, trip_stop_map):
+        self.stop_ids = []
+        self.stop_index = {}
+        self.trip_ids = list(trip_stop_map)
+        self.trip_index = {trip_id: t for t, trip_id in enumerate(self.trip_ids)}
+
+        # Suite des arrêts de chaque trip, pour reconstruire les tronçons
+        trip_offsets = [0]
+        trip_stops = []
+
+        dep_stop, arr_stop, dep_time, arr_time, trip, pos = [], [], [], [], [], []
+        for t, trip_id in enumerate(self.trip_ids):
+            stops_info = trip_stop_map[trip_id]
+            for i, (stop_id, _, _, _) in enumerate(stops_info):
+                if stop_id not in self.stop_index:
+                    self.stop_index[stop_id] = len(self.stop_ids)
+                    self.stop_ids.append(stop_id)
+                trip_stops.append(self.stop_index[stop_id])
+
+                if i + 1 < len(stops_info):
+                    _, _, _, dep1 = stops_info[i]
+                    s2, _, arr2, _ = stops_info[i + 1]
+                    # Connexion ignorée si les horaires manquent ou sont incohérents
+                    if dep1 is None or arr2 is None or arr2 < dep1:
+                        continue
+                    dep_stop.append(self.stop_index[stop_id])
+                    arr_stop.append(s2)  # interné ci-dessous, une fois tous les arrêts connus
+                    dep_time.append(dep1)
+                    arr_time.append(arr2)
+                    trip.append(t)
+                    pos.append(i)
+            trip_offsets.append(len(trip_stops))
+
+        arr_stop = [self.stop_index[s] for s in arr_stop]
+
+        # Tri par heure de départ (puis d'arrivée, pour les connexions de durée nulle)
+        dep_time = np.array(dep_time, dtype=np.int32)
+        arr_time = np.array(arr_time, dtype=np.int32)
+        order = np.lexsort((arr_time, dep_time))
+        self.c_dep_stop = np.array(dep_stop, dtype=np.int32)[order]
+        self.c_arr_stop = np.array(arr_stop, dtype=np.int32)[order]
+        self.c_dep_time = dep_time[order]
+        self.c_arr_time = arr_time[order]
+        self.c_trip = np.array(trip, dtype=np.int32)[order]
+        self.c_pos = np.array(pos, dtype=np.int32)[order]
+
+        self.trip_offsets = np.array(trip_offsets, dtype=np.int64)
+        self.trip_stops = np.array(trip_stops, dtype=np.int32)
+
+    def earliest_arrival(self, source_ids, target_ids, departure_time, active_trips=None,
+                         min_transfer_sec=MIN_TRANSFER_SEC):
+        """
+        Cherche l'arrivée au plus tôt à l'un des `target_ids` en partant de l'un des `source_ids`
+        à `departure_time` (secondes depuis minuit).
+        `active_trips` (ensemble de trip_id) restreint les trips utilisables.
+        Retourne un Journey (voir raptor.py) ou None si aucun itinéraire n'est trouvé.
+        """
+        n_stops = len(self.stop_ids)
+        # ready[s] : heure à partir de laquelle on peut monter dans un nouveau train en s
+        ready = [INF] * n_stops
+        earliest = [INF] * n_stops
+        # in_connection[s] = (connexion de montée, connexion de descente) du meilleur tronçon vers s
+        in_connection = [None] * n_stops
+        # trip_boarded[t] = connexion à laquelle on est monté dans le trip t (-1 sinon)
+        trip_boarded = [-1] * len(self.trip_ids)
+
+        for stop_id in source_ids:
+            s = self.stop_index.get(stop_id)
+            if s is not None:
+                ready[s] = departure_time
+                earliest[s] = departure_time
+        targets = {self.stop_index[t] for t in target_ids if t in self.stop_index}
+        if not targets:
+            return None
+
+        if active_trips is not None:
+            trip_active = [False] * len(self.trip_ids)
+            for trip_id in active_trips:
+                t = self.trip_index.get(trip_id)
+                if t is not None:
+                    trip_active[t] = True
+        else:
+            trip_active = None
+
+        best_target = INF
+        n = len(self.c_dep_time)
+        start = int(np.searchsorted(self.c_dep_time, departure_time, side='left'))
+
+        for chunk_start in range(start, n, SCAN_CHUNK):
+            chunk_end = min(chunk_start + SCAN_CHUNK, n)
+            dep_times = self.c_dep_time[chunk_start:chunk_end].tolist()
+            # Arrêt anticipé : plus aucune connexion ne peut améliorer l'arrivée
+            if dep_times[0] >= best_target:
+                break
+            dep_stops = self.c_dep_stop[chunk_start:chunk_end].tolist()
+            arr_stops = self.c_arr_stop[chunk_start:chunk_end].tolist()
+            arr_times = self.c_arr_time[chunk_start:chunk_end].tolist()
+            trips = self.c_trip[chunk_start:chunk_end].tolist()
+
+            for i, dep in enumerate(dep_times):
+                if dep >= best_target:
+                    break
+                t = trips[i]
+                if trip_boarded[t] == -1:
+                    if ready[dep_stops[i]] > dep:
+                        continue
+                    if trip_active is not None and not trip_active[t]:
+                        continue
+                    trip_boarded[t] = chunk_start + i
+
+                a = arr_stops[i]
+                arr = arr_times[i]
+                if arr < earliest[a]:
+                    earliest[a] = arr
+                    ready[a] = arr + min_transfer_sec
+                    in_connection[a] = (trip_boarded[t], chunk_start + i)
+                    if arr < best_target and a in targets:
+                        best_target = arr
+
+        if best_target == INF:
+            return None
+        target = min(targets, key=lambda s: earliest[s])
+        return self._reconstruct(in_connection, target)
+
+    def profile(self, source_ids, target_ids, window_start, window_end, active_trips=None,
+                min_transfer_sec=MIN_TRANSFER_SEC):
+        """
+        Requête de profil (profile CSA) : en un seul parcours des connexions par heure de départ
+        décroissante, calcule pour chaque arrêt l'ensemble Pareto des couples (départ, arrivée à la cible).
+        Retourne les Journey non dominés partant de l'un des `source_ids` entre `window_start`
+        et `window_end` (secondes depuis minuit), triés par heure de départ.
+        """
+        targets = {self.stop_index[t] for t in target_ids if t in self.stop_index}
+        sources = {self.stop_index[s] for s in source_ids if s in self.stop_index}
+        if not targets or not sources:
+            return []
+
+        if active_trips is not None:
+            trip_active = [False] * len(self.trip_ids)
+            for trip_id in active_trips:
+                t = self.trip_index.get(trip_id)
+                if t is not None:
+                    trip_active[t] = True
+        else:
+            trip_active = None
+
+        # trip_arrival[t] : arrivée au plus tôt à la cible en restant dans t ; trip_exit[t] : connexion de descente
+        trip_arrival = [INF] * len(self.trip_ids)
+        trip_exit = [-1] * len(self.trip_ids)
+        # Profils par arrêt, ajoutés par départ décroissant : neg_deps (croissant, pour bisect),
+        # arrivées, et (connexion de montée, connexion de descente) de chaque entrée
+        neg_deps = defaultdict(list)
+        arrivals = defaultdict(list)
+        moves = defaultdict(list)
+        # Profil commun des sources, à part : seuls les départs de la fenêtre y entrent. Dans les profils
+        # par arrêt, un départ après window_end dominerait les départs de la fenêtre qui arrivent plus tard
+        # (départ, arrivée, coups) par départ décroissant
+        candidates = []
+
+        start = int(np.searchsorted(self.c_dep_time, window_start, side='left'))
+        end = len(self.c_dep_time)
+        for chunk_end in range(end, start, -SCAN_CHUNK):
+            chunk_start = max(chunk_end - SCAN_CHUNK, start)
+            dep_times = self.c_dep_time[chunk_start:chunk_end].tolist()
+            dep_stops = self.c_dep_stop[chunk_start:chunk_end].tolist()
+            arr_stops = self.c_arr_stop[chunk_start:chunk_end].tolist()
+            arr_times = self.c_arr_time[chunk_start:chunk_end].tolist()
+            trips = self.c_trip[chunk_start:chunk_end].tolist()
+
+            for i in range(len(dep_times) - 1, -1, -1):
+                t = trips[i]
+                if trip_active is not None and not trip_active[t]:
+                    continue
+                a = arr_stops[i]
+                arr = arr_times[i]
+
+                # Descendre ici : à la cible, ou pour la meilleure correspondance
+                best = INF
+                if a in targets:
+                    best = arr
+                elif a in neg_deps:
+                    j = bisect_right(neg_deps[a], -(arr + min_transfer_sec)) - 1
+                    if j >= 0:
+                        best = arrivals[a][j]
+                c = chunk_start + i
+                if best < trip_arrival[t]:
+                    trip_arrival[t] = best
+                    trip_exit[t] = c
+                # Ou rester dans le train
+                tc = trip_arrival[t]
+                if tc == INF:
+                    continue
+
+                d = dep_stops[i]
+                dep = dep_times[i]
+                if d in sources and dep <= window_end and (not candidates or tc < candidates[-1][1]):
+                    if candidates and candidates[-1][0] == dep:
+                        candidates[-1] = (dep, tc, (c, trip_exit[t]))
+                    else:
+                        candidates.append((dep, tc, (c, trip_exit[t])))
+
+                # Ajout au profil de l'arrêt de départ s'il n'est pas dominé
+                stop_arrivals = arrivals[d]
+                if stop_arrivals and tc >= stop_arrivals[-1]:
+                    continue
+                if stop_arrivals and neg_deps[d][-1] == -dep:
+                    stop_arrivals[-1] = tc
+                    moves[d][-1] = (c, trip_exit[t])
+                else:
+                    neg_deps[d].append(-dep)
+                    stop_arrivals.append(tc)
+                    moves[d].append((c, trip_exit[t]))
+
+        journeys = [self._profile_journey(move, targets, neg_deps, moves, min_transfer_sec)
+                    for _, _, move in candidates]
+        journeys.reverse()
+        return journeys
+
+    def _profile_journey(self, move, targets, neg_deps, moves, min_transfer_sec):
+        """Suit les entrées de profil (montée, descente) depuis une source jusqu'à la cible."""
+        legs = []
+        while True:
+            board, alight = move
+            in_connection = [None] * len(self.stop_ids)
+            s = int(self.c_arr_stop[alight])
+            in_connection[s] = (board, alight)
+            legs.extend(self._reconstruct(in_connection, s).legs)
+            if s in targets:
+                break
+            j = bisect_right(neg_deps[s], -(int(self.c_arr_time[alight]) + min_transfer_sec)) - 1
+            move = moves[s][j]
+        return Journey(legs[0].departure_time, legs[-1].arrival_time, legs)
+
+    def _reconstruct(self, in_connection, target):
+        """Remonte les connexions depuis `target` pour reconstruire les tronçons."""
+        legs = []
+        s = target
+        while in_connection[s] is not None:
+            board, alight = in_connection[s]
+            t = int(self.c_trip[board])
+            offset = int(self.trip_offsets[t])
+            stops = self.trip_stops[offset + int(self.c_pos[board]):offset + int(self.c_pos[alight]) + 2]
+            legs.append(Leg(
+                trip_id=self.trip_ids[t],
+                from_stop=self.stop_ids[int(self.c_dep_stop[board])],
+                departure_time=int(self.c_dep_time[board]),
+                to_stop=self.stop_ids[int(self.c_arr_stop[alight])],
+                arrival_time=int(self.c_arr_time[alight]),
+                stops=[self.stop_ids[x] for x in stops.tolist()],
+            ))
+            s = int(self.c_dep_stop[board])
+
+        if not legs:
+            return None
+        legs.reverse()
+        return Journey(legs[0].departure_time, legs[-1].arrival_time, legs)
+
+
+def main():
+    # Comparaison de profile avec earliest_arrival : pour plusieurs heures t de la fenêtre, le profil doit
+    # contenir un trajet partant à t ou après et arrivant aussi tôt que l'arrivée au plus tôt depuis t
+    # (dès que celle-ci part dans la fenêtre)
+    import random
+    from datetime import date
+    from timetable import get_timetable
+
+    timetable = get_timetable()
+    network = timetable.csa
+    current_date = date(2025, 1, 20)
+    active = timetable.calendar.active_trips(current_date)
+
+    # Paires tirées parmi les arrêts les plus desservis, pour que la plupart soient reliées
+    random.seed(0)
+    busiest = np.argsort(np.bincount(network.c_dep_stop, minlength=len(network.stop_ids)))[-300:]
+    stop_ids = [network.stop_ids[s] for s in busiest.tolist()]
+    queries = [(['StopPoint:OCETrain TER-87751321'], ['StopPoint:OCETrain TER-87751800'], 65000, 66000)]
+    for _ in range(200):
+        source, target = random.sample(stop_ids, 2)
+        window_start = random.randrange(5 * 3600, 20 * 3600)
+        queries.append(([source], [target], window_start, window_start + 3 * 3600))
+
+    checked = errors = 0
+    for source_ids, target_ids, window_start, window_end in queries:
+        journeys = network.profile(source_ids, target_ids, window_start, window_end, active)
+        for t in range(window_start, window_end + 1, 900):
+            journey = network.earliest_arrival(source_ids, target_ids, t, active)
+            if journey is None or journey.departure_time > window_end:
+                continue
+            checked += 1
+            best = min((j.arrival_time for j in journeys if j.departure_time >= t), default=INF)
+            if best != journey.arrival_time:
+                errors += 1
+                print(f"{source_ids[0]} -> {target_ids[0]} depuis {t} : profil {best}, "
+                      f"earliest_arrival {journey.arrival_time}")
+    print(f"Écarts profile / earliest_arrival : {errors} sur {checked} départs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import heapq
+
+import numpy as np
+
+INF = float('inf')
+
+# Rayon moyen de la Terre, en mètres
+EARTH_RADIUS_M = 6371000.0
+
+
+def great_circle_m(lat1, lon1, lat2, lon2):
+    """
+    Distance orthodromique (formule de haversine) en mètres, vectorisée sur des tableaux
+    NumPy de latitudes / longitudes en radians.
+    """
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+class CSRGraph:
+    """
+    Graphe des durées au format CSR (Compressed Sparse Row) sur des indices d'arrêts entiers :
+    les arcs sortants de l'arrêt i sont targets[offsets[i]:offsets[i+1]], de poids
+    weights[offsets[i]:offsets[i+1]].
+    Dijkstra y garde distances et parents dans des tableaux indexés par arrêt et ne reconstruit
+    le chemin qu'une fois la cible atteinte.
+    """
+
+    def __init__(self, stop_ids, offsets, targets, weights, stop_coords=None):
+        self.stop_ids = list(stop_ids)
+        self.stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+
+        self.lat = None
+        self.lon = None
+        self.max_speed = None
+        self.zero_duration_m = 0.0
+        if stop_coords is not None:
+            self.set_coordinates(stop_coords)
+
+    @classmethod
+    def from_graph(cls, graph, stop_coords=None):
+        """Construit le CSR depuis graph[stop_id] = [(autre_stop_id, duree), ...]."""
+        stop_index = {}
+        for stop_id, neighbors in graph.items():
+            stop_index.setdefault(stop_id, len(stop_index))
+            for neighbor, _ in neighbors:
+                stop_index.setdefault(neighbor, len(stop_index))
+
+        offsets = np.zeros(len(stop_index) + 1, dtype=np.int64)
+        targets = []
+        weights = []
+        for i, stop_id in enumerate(stop_index):
+            for neighbor, duration in graph.get(stop_id, ()):
+                targets.append(stop_index[neighbor])
+                weights.append(duration)
+            offsets[i + 1] = len(targets)
+
+        return cls(stop_index, offsets, np.array(targets, dtype=np.int32), np.array(weights, dtype=np.int32),
+                   stop_coords)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, stop_coords=None):
+        """Réutilise l'adjacence CSR d'un snapshot binaire (voir snapshot.py), sans copie."""
+        return cls(snapshot.stop_ids.tolist(), snapshot.adj_offsets, snapshot.adj_targets, snapshot.adj_weights,
+                   stop_coords)
+
+    def set_coordinates(self, stop_coords):
+        """
+        Enregistre les coordonnées (stop_coords[stop_id] = (lat, lon)) en tableaux alignés
+        sur les indices d'arrêts, et calcule la vitesse maximale observée sur les arcs
+        (distance orthodromique / durée), qui sert de borne à l'heuristique A*, ainsi que
+        la longueur totale des arcs de durée nulle (zero_duration_m, voir heuristic).
+        """
+        lat = np.full(len(self.stop_ids), np.nan)
+        lon = np.full(len(self.stop_ids), np.nan)
+        for stop_id, (stop_lat, stop_lon) in stop_coords.items():
+            i = self.stop_index.get(stop_id)
+            if i is not None:
+                lat[i] = stop_lat
+                lon[i] = stop_lon
+        self.lat = np.radians(lat)
+        self.lon = np.radians(lon)
+
+        sources = np.repeat(np.arange(len(self.stop_ids)), np.diff(self.offsets))
+        targets = np.asarray(self.targets)
+        weights = np.asarray(self.weights)
+        distances = great_circle_m(self.lat[sources], self.lon[sources], self.lat[targets], self.lon[targets])
+        # Les arcs de durée nulle (arrondi à la minute des horaires) ne bornent pas la vitesse :
+        # leur longueur est déduite de l'heuristique à la place
+        moving = weights > 0
+        speeds = distances[moving] / weights[moving]
+        self.max_speed = float(np.nanmax(speeds)) if np.any(~np.isnan(speeds)) else None
+        self.zero_duration_m = float(np.nansum(distances[~moving]))
+
+    def heuristic(self, goals):
+        """
+        Borne inférieure du temps restant (en secondes) depuis chaque arrêt jusqu'à la cible
+        la plus proche : (distance orthodromique - zero_duration_m) / vitesse maximale, calculée
+        pour tous les arrêts d'un coup. Les arcs de durée nulle (quelques centaines de mètres
+        chacun) franchissent une distance en 0 s : retrancher leur longueur totale garde la borne
+        admissible quel que soit le nombre de ces arcs sur le chemin, pour quelques dizaines
+        de secondes d'heuristique en moins. Vaut 0 pour les arrêts sans coordonnées ou plus
+        proches que zero_duration_m.
+        """
+        goals = np.fromiter(goals, dtype=np.int64)
+        if self.max_speed is None or len(goals) == 0:
+            return [0.0] * len(self.stop_ids)
+        distances = great_circle_m(self.lat[:, None], self.lon[:, None], self.lat[goals][None, :], self.lon[goals][None, :])
+        h = np.maximum(np.min(distances, axis=1) - self.zero_duration_m, 0.0) / self.max_speed
+        return np.nan_to_num(h, nan=0.0).tolist()
+
+    def dijkstra(self, sources, goal_stop_ids):
+        """
+        Dijkstra multi-sources / multi-cibles, même contrat que itinéraireTrain.dijkstra_multi :
+        `sources` : dict[stop_id -> coût initial].
+        Retourne (chemin, cout_total, source, cible) ou (None, inf, None, None) si pas trouvé.
+        """
+        result, _ = self._search(sources, goal_stop_ids, use_heuristic=False)
+        return result
+
+    def astar(self, sources, goal_stop_ids):
+        """
+        Comme dijkstra, mais guidé par l'heuristique géographique (voir heuristic) :
+        la recherche s'oriente vers les cibles et visite beaucoup moins d'arrêts sur les longs trajets.
+        Nécessite les coordonnées (set_coordinates) ; sinon équivaut à dijkstra.
+        """
+        result, _ = self._search(sources, goal_stop_ids, use_heuristic=True)
+        return result
+
+    def _search(self, sources, goal_stop_ids, use_heuristic):
+        """Recherche commune à dijkstra et astar. Retourne (résultat, nombre d'arrêts visités)."""
+        n = len(self.stop_ids)
+        dist = [INF] * n
+        parent = [-1] * n
+        # closed[u] : coût avec lequel u a été visité ; une heuristique non monotone peut
+        # faire revisiter un arrêt avec un coût plus faible
+        closed = [INF] * n
+        goals = {self.stop_index[g] for g in goal_stop_ids if g in self.stop_index}
+        h = self.heuristic(goals) if use_heuristic and self.lat is not None else None
+
+        heap = []
+        for stop_id, initial_cost in sources.items():
+            s = self.stop_index.get(stop_id)
+            if s is not None and initial_cost < dist[s]:
+                dist[s] = initial_cost
+                heap.append((initial_cost + (h[s] if h else 0), initial_cost, s))
+        heapq.heapify(heap)
+
+        offsets = self.offsets
+        targets = self.targets
+        weights = self.weights
+        n_settled = 0
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            # Entrée périmée : l'arrêt a été atteint depuis par un chemin plus court
+            if d > dist[u] or closed[u] <= d:
+                continue
+            closed[u] = d
+            n_settled += 1
+
+            if u in goals:
+                path = [u]
+                while parent[path[-1]] != -1:
+                    path.append(parent[path[-1]])
+                path.reverse()
+                stop_path = [self.stop_ids[i] for i in path]
+                return (stop_path, d, stop_path[0], stop_path[-1]), n_settled
+
+            start, end = offsets[u], offsets[u + 1]
+            for v, w in zip(targets[start:end].tolist(), weights[start:end].tolist()):
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + (h[v] if h else 0), nd, v))
+
+        return (None, INF, None, None), n_settled
+
+
+def main():
+    # Comparaison Dijkstra / A* (arrêts visités et temps) sur de longs trajets
+    import time
+    from timetable import get_timetable
+
+    timetable = get_timetable()
+    graph = timetable.csr
+    print(f"Vitesse maximale observée : {graph.max_speed * 3.6:.0f} km/h")
+
+    for departure_name, arrival_name in [("Strasbourg", "Bordeaux"), ("Lille", "Marseille"), ("Brest", "Nice")]:
+        sources = {stop_id: 0 for stop_id in timetable.name_index.resolve(departure_name)}
+        goals = timetable.name_index.resolve(arrival_name)
+        for use_heuristic in (False, True):
+            start = time.perf_counter()
+            (path, cost, _, _), n_settled = graph._search(sources, goals, use_heuristic)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            label = "A*      " if use_heuristic else "Dijkstra"
+            print(f"{departure_name} -> {arrival_name} {label} : {n_settled} arrêts visités, "
+                  f"coût {cost}, {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
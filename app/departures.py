@@ -0,0 +1,95 @@
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from columnar import format_time, NO_TIME, NO_TYPE
+
+
+class DepartureIndex:
+    """
+    Index des départs par arrêt, construit depuis les colonnes de stop_times (voir columnar.StopTimes),
+    sans relire le fichier. Pour chaque arrêt, les départs sont triés par (départ en secondes,
+    stop_sequence) ; le prochain départ après (date, heure) se trouve par recherche dichotomique
+    sur l'heure, puis le premier trip circulant ce jour-là est retenu via le calendrier
+    (voir calendar_service.ServiceCalendar). Les jours sont parcourus dans l'ordre, ce qui
+    revient à trier par (date de service, départ, stop_sequence).
+
+    Seuls des indices et des entiers sont gardés (tableaux compacts, trips et arrêts internés) ;
+    les départs ne redeviennent des dictionnaires de chaînes que dans next_departures.
+
+    Filtres appliqués à la construction :
+      - arrêts sans montée ni descente (pickup_type == drop_off_type == 1) ignorés
+      - lignes sans arrival_time / departure_time ignorées
+    """
+
+    def __init__(self, stop_times, calendar):
+        self.calendar = calendar
+        self.trip_ids = stop_times.trips.ids
+        self.stops = stop_times.stops
+
+        kept = np.flatnonzero(
+            ~((stop_times.pickup == 1) & (stop_times.drop_off == 1))
+            & (stop_times.arr != NO_TIME) & (stop_times.dep != NO_TIME)
+        )
+        stop = np.asarray(stop_times.stop)[kept]
+        dep = np.asarray(stop_times.dep)[kept]
+        seq = np.asarray(stop_times.seq)[kept]
+        rows = kept[np.lexsort((seq, dep, stop))]
+
+        # Les départs de l'arrêt s sont [offsets[s], offsets[s + 1])
+        offsets = np.zeros(len(self.stops) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(stop, minlength=len(self.stops)), out=offsets[1:])
+        self._offsets = array('q', offsets.tolist())
+        self._dep = array('i', np.asarray(stop_times.dep)[rows].tolist())
+        self._arr = array('i', np.asarray(stop_times.arr)[rows].tolist())
+        self._seq = array('i', np.asarray(stop_times.seq)[rows].tolist())
+        self._trip = array('i', np.asarray(stop_times.trip)[rows].tolist())
+        self._pickup = array('b', np.asarray(stop_times.pickup)[rows].tolist())
+        self._drop_off = array('b', np.asarray(stop_times.drop_off)[rows].tolist())
+
+    @staticmethod
+    def _type_str(value):
+        return '' if value == NO_TYPE else str(value)
+
+    def next_departures(self, stop_id, current_date, current_time_sec, n=1):
+        """
+        Retourne les `n` prochains départs depuis `stop_id` à partir de `current_date`
+        et `current_time_sec`, sous forme de dictionnaires au format des lignes de stop_times.txt
+        (plus 'service_date', le jour de circulation au format ISO).
+        """
+        s = self.stops.get(stop_id)
+        if s is None:
+            return []
+        start, end = self._offsets[s], self._offsets[s + 1]
+        if start == end:
+            return []
+
+        departures = []
+        for date in self.calendar.dates_from(current_date):
+            # Premier départ à l'heure exacte ou après, quel que soit stop_sequence
+            first = bisect_left(self._dep, current_time_sec, start, end) if date == current_date else start
+            for i in range(first, end):
+                trip_id = self.trip_ids[self._trip[i]]
+                if not self.calendar.runs(trip_id, date):
+                    continue
+                departures.append({
+                    'trip_id': trip_id,
+                    'arrival_time': format_time(self._arr[i]),
+                    'departure_time': format_time(self._dep[i]),
+                    'stop_id': stop_id,
+                    'stop_sequence': str(self._seq[i]),
+                    'pickup_type': self._type_str(self._pickup[i]),
+                    'drop_off_type': self._type_str(self._drop_off[i]),
+                    'service_date': date.isoformat(),
+                })
+                if len(departures) == n:
+                    return departures
+        return departures
+
+    def prochain_depart(self, stop_id, current_date, current_time_sec):
+        """
+        Retourne le prochain départ (dictionnaire, voir next_departures) ou None.
+        """
+        departures = self.next_departures(stop_id, current_date, current_time_sec, n=1)
+        return departures[0] if departures else None
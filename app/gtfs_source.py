@@ -0,0 +1,78 @@
+import io
+import os
+import zipfile
+from contextlib import contextmanager
+
+# Taille des blocs lus dans l'archive : le CSV est analysé au fil de la décompression
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+# Fichiers qu'un dossier GTFS doit contenir pour être lu tel quel (voir feed_source)
+REQUIRED_FILES = ('stops.txt', 'stop_times.txt', 'trips.txt', 'calendar_dates.txt', 'feed_info.txt')
+
+
+def _archive_members(archive):
+    """
+    {nom du fichier: membre} des fichiers GTFS de l'archive, à la racine ou dans un sous-dossier.
+    """
+    members = {}
+    with zipfile.ZipFile(archive) as zf:
+        for name in zf.namelist():
+            if name.startswith('__MACOSX/') or name.endswith('/'):
+                continue
+            members.setdefault(name.rsplit('/', 1)[-1], name)
+    return members
+
+
+def feed_source(gtfs_dir):
+    """
+    Source unique des fichiers d'un dossier GTFS, pour ne jamais mélanger deux flux :
+      - le dossier lui-même s'il contient tous les REQUIRED_FILES ;
+      - sinon l'archive du même nom (ex : dataSncf -> dataSncf.zip) si elle les contient tous,
+        même pour les fichiers déjà extraits dans le dossier (ils peuvent venir d'un autre flux) ;
+      - sinon le dossier, tel quel.
+    Retourne (archive, {nom du fichier: membre}) pour l'archive, None pour le dossier.
+    """
+    gtfs_dir = os.path.normpath(gtfs_dir)
+    if all(os.path.exists(os.path.join(gtfs_dir, name)) for name in REQUIRED_FILES):
+        return None
+    archive = gtfs_dir + '.zip'
+    if not zipfile.is_zipfile(archive):
+        return None
+    members = _archive_members(archive)
+    if not all(name in members for name in REQUIRED_FILES):
+        return None
+    return archive, members
+
+
+def gtfs_exists(filename):
+    """Vrai si le fichier GTFS est lisible depuis la source de son dossier (voir feed_source)."""
+    gtfs_dir, basename = os.path.split(os.path.normpath(filename))
+    source = feed_source(gtfs_dir)
+    if source is None:
+        return os.path.exists(filename)
+    return basename in source[1]
+
+
+@contextmanager
+def open_gtfs(filename):
+    """
+    Ouvre un fichier GTFS en texte, à passer à csv.DictReader.
+    Le fichier est lu depuis la source de son dossier (voir feed_source) : le fichier extrait,
+    ou le membre correspondant de l'archive (ex : dataSncf.zip), lu directement sans extraction.
+    """
+    gtfs_dir, basename = os.path.split(os.path.normpath(filename))
+    source = feed_source(gtfs_dir)
+    if source is None:
+        with open(filename, mode='r', encoding='utf-8', newline='') as f:
+            yield f
+        return
+
+    archive, members = source
+    if basename not in members:
+        raise FileNotFoundError(f"{basename} absent de {archive}.")
+    with zipfile.ZipFile(archive) as zf:
+        with zf.open(members[basename]) as raw:
+            buffered = io.BufferedReader(raw, buffer_size=READ_BUFFER_SIZE)
+            with io.TextIOWrapper(buffered, encoding='utf-8', newline='') as f:
+                yield f
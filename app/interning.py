@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class Interner:
+    """
+    Correspondance dense entre identifiants GTFS (stop_id, trip_id, route_id...) et entiers :
+    ids[i] est l'identifiant d'indice i, index[identifiant] son indice, dans l'ordre de première
+    apparition. Les structures de calcul ne gardent que les indices ; chaque identifiant n'existe
+    qu'une fois en mémoire et n'est retrouvé qu'à l'affichage.
+    """
+
+    __slots__ = ('ids', 'index')
+
+    def __init__(self, ids=()):
+        self.ids = []
+        self.index = {}
+        for value in ids:
+            self.intern(value)
+
+    def intern(self, value):
+        """Indice de `value`, ajouté s'il est nouveau."""
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.ids)
+            self.ids.append(value)
+        return i
+
+    def intern_array(self, values):
+        """
+        Version vectorisée d'intern pour un tableau NumPy d'identifiants en octets (dtype 'S') :
+        seules les valeurs distinctes passent par le dictionnaire. Retourne les indices (int32).
+        """
+        uniques, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+        codes = np.empty(len(uniques), dtype=np.int32)
+        for u in np.argsort(first, kind='stable').tolist():
+            codes[u] = self.intern(uniques[u].decode('utf-8'))
+        return codes[inverse.reshape(-1)]
+
+    def get(self, value, default=None):
+        """Indice de `value`, ou `default` s'il n'a jamais été interné."""
+        return self.index.get(value, default)
+
+    def __getitem__(self, i):
+        return self.ids[i]
+
+    def __contains__(self, value):
+        return value in self.index
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
@@ -2,7 +2,16 @@ import csv
 from collections import defaultdict
 import heapq
 import os 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+from raptor import RaptorNetwork, MAX_ROUNDS
+from csa import ConnectionScan
+from name_index import StationNameIndex
+from calendar_service import ServiceCalendar
+from gtfs_source import open_gtfs
+from columnar import read_stop_times_columns
+from departures import DepartureIndex
+from csr_graph import CSRGraph
 
 def parse_time(hms_str):
     """
@@ -14,6 +23,15 @@ def parse_time(hms_str):
     h, m, s = map(int, hms_str.split(':'))
     return h * 3600 + m * 60 + s
 
+def format_hms(seconds):
+    """
+    Convertit un nombre de secondes en chaîne 'HH:MM:SS' (inverse de parse_time).
+    """
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    seconds = seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
 def read_stops(stops_filename):
     """
     Lit stops.txt et retourne:
@@ -24,7 +42,7 @@ def read_stops(stops_filename):
     stops_dict = {}
     name_to_id = defaultdict(list)
 
-    with open(stops_filename, mode='r', encoding='utf-8') as f:
+    with open_gtfs(stops_filename) as f:
         reader = csv.DictReader(f)
         for row in reader:
             stop_id = row['stop_id']
@@ -41,6 +59,26 @@ def read_stops(stops_filename):
 
     return stops_dict, name_to_id
 
+def read_stop_coords(stops_filename):
+    """
+    Lit stops.txt et retourne stop_coords[stop_id] = (lat, lon) pour tous les StopPoint
+    (comme read_stops_map dans graph.py, mais sans filtrer le mode : le graphe contient aussi
+    les arrêts de car).
+    """
+    stop_coords = {}
+    with open_gtfs(stops_filename) as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            stop_id = row['stop_id']
+            if stop_id.startswith("StopArea:"):
+                continue
+            try:
+                stop_coords[stop_id] = (float(row['stop_lat']), float(row['stop_lon']))
+            except (KeyError, TypeError, ValueError):
+                # Coordonnées absentes ou illisibles : l'arrêt est ignoré
+                pass
+    return stop_coords
+
 def read_stop_times(stop_times_filename):
     """
     Lit stop_times.txt et construit un dict :
@@ -48,7 +86,7 @@ def read_stop_times(stop_times_filename):
     trié par stop_sequence.
     """
     trip_stop_map = defaultdict(list)
-    with open(stop_times_filename, mode='r', encoding='utf-8') as f:
+    with open_gtfs(stop_times_filename) as f:
         reader = csv.DictReader(f)
         for row in reader:
             trip_id = row['trip_id']
@@ -64,13 +102,11 @@ def read_stop_times(stop_times_filename):
         trip_stop_map[t_id].sort(key=lambda x: x[1])
     return trip_stop_map
 
-def build_graph_with_duration(trip_stop_map):
+def iter_duration_edges(trip_stop_map):
     """
-    Construit un graphe pondéré (durée en secondes).
-    graph[stop_id] = list of (autre_stop_id, duree_en_secondes).
+    Parcourt les arcs (s1, s2, duree_en_secondes) entre arrêts consécutifs de chaque trip,
+    avec les mêmes règles que build_graph_with_duration (un arc par trip, dans les deux sens).
     """
-    graph = defaultdict(list)
-
     for trip_id, stops_info in trip_stop_map.items():
         # stops_info est trié par stop_sequence
         for i in range(len(stops_info) - 1):
@@ -88,144 +124,258 @@ def build_graph_with_duration(trip_stop_map):
                 continue
 
             # Ajout arc s1->s2
-            graph[s1].append((s2, duration_s1_s2))
+            yield s1, s2, duration_s1_s2
 
             # Ajout arc s2->s1 (bidirectionnel, hypothèse)
             # On pourrait recalculer, ex arr1 - dep2, si la durée n’est pas symétrique
             if (arr1 is not None) and (dep2 is not None):
                 duration_s2_s1 = arr1 - dep2
                 if duration_s2_s1 >= 0:
-                    graph[s2].append((s1, duration_s2_s1))
+                    yield s2, s1, duration_s2_s1
             else:
                 # sinon on suppose la même durée
-                graph[s2].append((s1, duration_s1_s2))
+                yield s2, s1, duration_s1_s2
 
+def build_graph_with_duration(trip_stop_map):
+    """
+    Construit un graphe pondéré (durée en secondes).
+    graph[stop_id] = list of (autre_stop_id, duree_en_secondes).
+    """
+    graph = defaultdict(list)
+    for s1, s2, duration in iter_duration_edges(trip_stop_map):
+        graph[s1].append((s2, duration))
     return graph
 
+def build_dedup_graph(trip_stop_map, aggregate="min"):
+    """
+    Comme build_graph_with_duration, mais les arcs parallèles (même s1 -> s2, un par trip)
+    sont fusionnés en un seul arc.
+    `aggregate` choisit la durée conservée :
+      - "min"    : la plus courte (Dijkstra donne alors exactement les mêmes chemins)
+      - "median" : la durée médiane des trips
+    Retourne (graph, trip_counts, stats) :
+      - graph[stop_id] = list of (autre_stop_id, duree_en_secondes), sans doublon
+      - trip_counts[(s1, s2)] = nombre de trips empruntant l'arc
+      - stats = {"edges_before", "edges_after", "reduction"} pour mesurer le gain
+    """
+    if aggregate not in ("min", "median"):
+        raise ValueError(f"Agrégation inconnue : {aggregate}")
+
+    durations = defaultdict(list)
+    for s1, s2, duration in iter_duration_edges(trip_stop_map):
+        durations[(s1, s2)].append(duration)
+
+    graph = defaultdict(list)
+    trip_counts = {}
+    edges_before = 0
+    for (s1, s2), values in durations.items():
+        if aggregate == "min":
+            duration = min(values)
+        else:
+            values.sort()
+            duration = values[len(values) // 2]
+        graph[s1].append((s2, duration))
+        trip_counts[(s1, s2)] = len(values)
+        edges_before += len(values)
+
+    edges_after = len(trip_counts)
+    stats = {
+        "edges_before": edges_before,
+        "edges_after": edges_after,
+        "reduction": round(edges_before / edges_after, 1) if edges_after else None,
+    }
+    return graph, trip_counts, stats
+
 def dijkstra(graph, start_stop_id, goal_stop_id):
     """
     Trouve le plus court chemin (en temps) entre start_stop_id et goal_stop_id, via Dijkstra.
     Retourne (chemin, cout_total) ou (None, inf) si pas trouvé.
     """
-    distances = defaultdict(lambda: float('inf'))
-    distances[start_stop_id] = 0
+    path, cost, _, _ = dijkstra_multi(graph, {start_stop_id: 0}, [goal_stop_id])
+    return path, cost
+
 
-    heap = [(0, start_stop_id, [start_stop_id])]
+def dijkstra_multi(graph, sources, goal_stop_ids):
+    """
+    Dijkstra multi-sources / multi-cibles : toutes les sources sont placées dans le tas dès le départ,
+    et la recherche s'arrête au premier arrêt cible atteint.
+    `sources` : dict[stop_id -> coût initial], ex : l'heure du prochain départ depuis cet arrêt,
+    pour que le gagnant soit celui qui arrive le plus tôt.
+    Retourne (chemin, cout_total, source, cible) ou (None, inf, None, None) si pas trouvé.
+    """
+    goals = set(goal_stop_ids)
+    distances = {}
+    parents = {}
+    origin = {}
+
+    heap = []
+    for stop_id, initial_cost in sources.items():
+        if initial_cost < distances.get(stop_id, float('inf')):
+            distances[stop_id] = initial_cost
+            origin[stop_id] = stop_id
+            heapq.heappush(heap, (initial_cost, stop_id))
     visited = set()
 
     while heap:
-        current_dist, current_stop, path = heapq.heappop(heap)
+        current_dist, current_stop = heapq.heappop(heap)
 
         if current_stop in visited:
             continue
         visited.add(current_stop)
 
-        if current_stop == goal_stop_id:
-            return path, current_dist
+        if current_stop in goals:
+            # Reconstruction du chemin à partir des parents
+            path = [current_stop]
+            while path[-1] in parents:
+                path.append(parents[path[-1]])
+            path.reverse()
+            return path, current_dist, origin[current_stop], current_stop
 
-        for (neighbor, cost) in graph[current_stop]:
+        # graph.get : le graphe peut être partagé entre requêtes, on ne doit pas le modifier
+        for (neighbor, cost) in graph.get(current_stop, ()):
             new_dist = current_dist + cost
-            if new_dist < distances[neighbor]:
+            if new_dist < distances.get(neighbor, float('inf')):
                 distances[neighbor] = new_dist
-                new_path = path + [neighbor]
-                heapq.heappush(heap, (new_dist, neighbor, new_path))
+                parents[neighbor] = current_stop
+                origin[neighbor] = origin[current_stop]
+                heapq.heappush(heap, (new_dist, neighbor))
 
-    return None, float('inf')
+    return None, float('inf'), None, None
 
 
-def extract_date_from_trip_id(trip_id):
+def itineraire_horaires(network, stops_dict, all_stops, current_time_sec, active_trips=None):
     """
-    Extrait la date d'un `trip_id` au format : "OCESN831716F3524380:2025-01-17T00:20:49Z".
-    Retourne une date (datetime.date) ou None si le format est incorrect.
+    Calcule l'itinéraire avec un moteur sur les horaires réels (raptor.RaptorNetwork ou
+    csa.ConnectionScan, qui exposent tous deux earliest_arrival) : chaque étape part de la gare
+    atteinte à l'étape précédente, à son heure d'arrivée, sans relire de données. Les temps
+    d'attente et de correspondance sont donc inclus dans la durée.
+    Retourne (path_names, duree_str, prochain_depart_time) comme itineraireTrain.
     """
-    try:
-        date_str = trip_id.split(":")[1].split("T")[0]
-        return datetime.strptime(date_str, "%Y-%m-%d").date()
-    except (IndexError, ValueError):
-        return None
+    full_path = []
+    first_departure = None
+    source_ids = all_stops[0]
 
+    for i in range(len(all_stops) - 1):
+        journey = network.earliest_arrival(source_ids, all_stops[i + 1], current_time_sec, active_trips)
+        if journey is None:
+            print(f"Aucun itinéraire trouvé pour l'étape {i + 1}.")
+            return None, None, None
 
-def prochain_depart(stop_times_filename, stop_id, current_date, current_time_sec):
-    """
-    Recherche le prochain départ depuis `stop_id` après `current_date` et `current_time_sec`,
-    en prenant en compte le plus petit `stop_sequence` en cas d'égalité des horaires.
+        if first_departure is None:
+            first_departure = journey.departure_time
+        for leg in journey.legs:
+            full_path.extend(leg.stops[:-1])  # Éviter de répéter l'arrêt de correspondance
 
-    Arguments :
-    - stop_times_filename : chemin vers le fichier CSV `stop_times`.
-    - stop_id : l'identifiant de l'arrêt.
-    - current_date : la date actuelle (datetime.date).
-    - current_time_sec : l'heure actuelle en secondes depuis minuit.
+        # L'étape suivante part de la gare réellement atteinte
+        source_ids = [journey.legs[-1].to_stop]
+        current_time_sec = journey.arrival_time
 
-    Retourne :
-    - Un dictionnaire contenant les informations du prochain départ.
-    """
-    prochain_horaire = None
-    prochain_depart = None
-    prochain_stop_sequence = None
+    full_path.append(source_ids[0])
 
-    with open(stop_times_filename, mode='r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['stop_id'] == stop_id:
-                # Extraire la date du trip_id
-                trip_date = extract_date_from_trip_id(row['trip_id'])
-                if trip_date is None or trip_date < current_date:
-                    continue
+    path_names = [stops_dict.get(s, s) for s in full_path]
+    return path_names, format_hms(current_time_sec - first_departure), format_hms(first_departure)
 
-                # Vérifier si l'arrêt est valide pour embarquer/débarquer
-                if row.get('pickup_type') == '1' and row.get('drop_off_type') == '1':
-                    continue
 
-                # Vérifier la validité des horaires
-                if not row.get('arrival_time') or not row.get('departure_time'):
-                    continue
+def itineraireProfil(stops_filename, stop_times_filename, departure_name, arrival_name, current_date,
+        window_start_sec, window_end_sec, timetable=None):
+    """
+    Requête de profil : tous les trajets non dominés (aucun autre ne part plus tard en arrivant
+    au moins aussi tôt) entre departure_name et arrival_name pour un départ dans
+    [window_start_sec, window_end_sec], calculés en un seul parcours (voir csa.ConnectionScan.profile).
+    Retourne une liste de (path_names, duree_str, depart_str, arrivee_str) triée par heure de départ,
+    ou None si une gare est introuvable.
+    """
+    if timetable is not None:
+        stops_dict, name_index = timetable.stops_dict, timetable.name_index
+        network, calendar = timetable.csa, timetable.calendar
+    else:
+        stops_dict, name_to_id = read_stops(stops_filename)
+        name_index = StationNameIndex(name_to_id)
+        network = ConnectionScan(read_stop_times_columns(stop_times_filename).trip_stop_map())
+        calendar = ServiceCalendar(os.path.dirname(stop_times_filename))
+
+    departure_ids = name_index.resolve(departure_name)
+    arrival_ids = name_index.resolve(arrival_name)
+    if not departure_ids or not arrival_ids:
+        print("Gare de départ ou d'arrivée introuvable.")
+        return None
 
-                # Convertir l'heure de départ en secondes depuis minuit
-                dep_sec = parse_time(row['departure_time'])
+    journeys = network.profile(departure_ids, arrival_ids, window_start_sec, window_end_sec,
+                               calendar.active_trips(current_date))
 
-                # Si la date est celle d'aujourd'hui, vérifier l'heure
-                if trip_date == current_date and (dep_sec is None or dep_sec < current_time_sec):
-                    continue
+    return [resume_trajet(journey, stops_dict) for journey in journeys]
+
+
+def itinerairePareto(stops_filename, stop_times_filename, departure_name, arrival_name, current_date,
+        current_time_sec, timetable=None, max_rounds=MAX_ROUNDS):
+    """
+    Compromis entre heure d'arrivée et nombre de correspondances pour un départ à partir de
+    current_time_sec : le trajet le plus direct, puis chaque trajet qui arrive plus tôt au prix
+    de correspondances supplémentaires (voir raptor.RaptorNetwork.pareto_journeys).
+    Retourne une liste de (path_names, duree_str, depart_str, arrivee_str, correspondances),
+    ou None si une gare est introuvable.
+    """
+    if timetable is not None:
+        stops_dict, name_index = timetable.stops_dict, timetable.name_index
+        network, calendar = timetable.raptor, timetable.calendar
+    else:
+        stops_dict, name_to_id = read_stops(stops_filename)
+        name_index = StationNameIndex(name_to_id)
+        network = RaptorNetwork(read_stop_times_columns(stop_times_filename).trip_stop_map())
+        calendar = ServiceCalendar(os.path.dirname(stop_times_filename))
+
+    departure_ids = name_index.resolve(departure_name)
+    arrival_ids = name_index.resolve(arrival_name)
+    if not departure_ids or not arrival_ids:
+        print("Gare de départ ou d'arrivée introuvable.")
+        return None
 
-                # Convertir le `stop_sequence` en entier
-                stop_sequence = int(row['stop_sequence'])
+    journeys = network.pareto_journeys(departure_ids, arrival_ids, current_time_sec,
+                                       calendar.active_trips(current_date), max_rounds)
+    return [resume_trajet(journey, stops_dict) + (len(journey.legs) - 1,) for journey in journeys]
 
-                # Rechercher le prochain horaire
-                if (
-                    prochain_horaire is None
-                    or (trip_date == current_date and dep_sec < prochain_horaire)
-                    or (
-                        dep_sec == prochain_horaire and stop_sequence < prochain_stop_sequence
-                    )
-                ):  
-                    prochain_horaire = dep_sec
-                    prochain_depart = row
-                    prochain_stop_sequence = stop_sequence
 
-    return prochain_depart
+def resume_trajet(journey, stops_dict):
+    """(path_names, duree_str, depart_str, arrivee_str) d'un raptor.Journey."""
+    path = [stop for leg in journey.legs for stop in leg.stops[:-1]] + [journey.legs[-1].to_stop]
+    return (
+        [stops_dict.get(s, s) for s in path],
+        format_hms(journey.arrival_time - journey.departure_time),
+        format_hms(journey.departure_time),
+        format_hms(journey.arrival_time),
+    )
 
 
 def itineraireTrain(stops_filename, stop_times_filename, departure_name, arrival_name, current_date, 
-        current_time_sec, intermediate_names=None):
+        current_time_sec, intermediate_names=None, timetable=None, engine="dijkstra"):
     """
     Renvoie (path_names, duree_str, prochain_depart_time) pour l'itinéraire le plus rapide
     à partir de maintenant entre departure_name et arrival_name, en passant par des villes intermédiaires.
+
+    Si `timetable` (voir timetable.Timetable) est fourni, ses structures déjà chargées
+    sont utilisées au lieu de relire stops.txt / stop_times.txt et de reconstruire le graphe.
+
+    `engine` choisit le moteur de recherche :
+      - "dijkstra" : plus court chemin sur le graphe des durées + prochain départ
+                     (avec timetable, via les arbres en cache de chaque gare de départ)
+      - "astar"    : même résultat que "dijkstra", guidé par la distance aux gares d'arrivée
+      - "ch"       : même résultat que "dijkstra", via la hiérarchie de contraction (nécessite timetable)
+      - "raptor"   : arrivée au plus tôt sur les horaires réels (attentes et correspondances comprises)
+      - "csa"      : même résultat que "raptor", par un parcours unique des connexions triées
     """
-    # Lecture des fichiers
-    stops_dict, name_to_id = read_stops(stops_filename)
-
-    # Conversion des noms en minuscules pour correspondre à ceux de stops.txt
-    departure_name = departure_name.lower()
-    arrival_name = arrival_name.lower()
-    intermediate_names = [name.lower() for name in intermediate_names] if intermediate_names else []
-
-    # Rechercher les IDs des gares pour chaque étape
-    departure_ids = [stop_id for stop_name, stop_ids in name_to_id.items() if departure_name in stop_name for stop_id in stop_ids]
-    arrival_ids = [stop_id for stop_name, stop_ids in name_to_id.items() if arrival_name in stop_name for stop_id in stop_ids]
-    intermediate_ids_list = [
-        [stop_id for stop_name, stop_ids in name_to_id.items() if name in stop_name for stop_id in stop_ids]
-        for name in intermediate_names
-    ]
+    # Lecture des fichiers (sauf si les données sont déjà en mémoire)
+    if timetable is not None:
+        stops_dict, name_index = timetable.stops_dict, timetable.name_index
+    else:
+        stops_dict, name_to_id = read_stops(stops_filename)
+        name_index = StationNameIndex(name_to_id)
+
+    intermediate_names = intermediate_names or []
+
+    # Rechercher les IDs des gares pour chaque étape (meilleure correspondance : exacte, préfixe, sous-chaîne)
+    departure_ids = name_index.resolve(departure_name)
+    arrival_ids = name_index.resolve(arrival_name)
+    intermediate_ids_list = [name_index.resolve(name) for name in intermediate_names]
 
     # Vérification des gares
     if not departure_ids:
@@ -238,60 +388,82 @@ def itineraireTrain(stops_filename, stop_times_filename, departure_name, arrival
         print("Une ou plusieurs gares intermédiaires sont introuvables.")
         return None, None, None
 
-    # Lecture de stop_times pour reconstruire le graphe
-    trip_stop_map = read_stop_times(stop_times_filename)
-    graph = build_graph_with_duration(trip_stop_map)
-
     # Étapes successives (départ -> intermédiaires -> arrivée)
     all_stops = [departure_ids] + intermediate_ids_list + [arrival_ids]
+
+    if engine in ("raptor", "csa"):
+        # Seuls les trips circulant à current_date sont utilisables
+        if timetable is not None:
+            network = timetable.raptor if engine == "raptor" else timetable.csa
+            calendar = timetable.calendar
+        else:
+            trip_stop_map = read_stop_times_columns(stop_times_filename).trip_stop_map()
+            network = RaptorNetwork(trip_stop_map) if engine == "raptor" else ConnectionScan(trip_stop_map)
+            calendar = ServiceCalendar(os.path.dirname(stop_times_filename))
+        active_trips = calendar.active_trips(current_date)
+        return itineraire_horaires(network, stops_dict, all_stops, current_time_sec, active_trips)
+
+    # Lecture de stop_times pour reconstruire le graphe (le Timetable fournit sa version CSR) :
+    # arrêts internés en entiers, les stop_id ne reviennent qu'avec le chemin trouvé.
+    # Les prochains départs viennent du même index que le Timetable (calendrier de circulation)
+    if timetable is None:
+        stop_times = read_stop_times_columns(stop_times_filename)
+        graph = CSRGraph.from_graph(build_dedup_graph(stop_times.trip_stop_map())[0])
+        departure_index = DepartureIndex(stop_times, ServiceCalendar(os.path.dirname(stop_times_filename)))
+    else:
+        departure_index = timetable.departure_index
+
     full_path = []
     total_duration = 0
     next_departure_time = None
 
+    start_ids = all_stops[0]
     for i in range(len(all_stops) - 1):
-        start_ids = all_stops[i]
         end_ids = all_stops[i + 1]
 
-        best_path = None
-        best_duration = float('inf')
-        best_departure = None
-
+        # Prochain départ depuis chaque gare candidate : il sert de coût initial à la recherche
+        departures = {}
         for start_id in start_ids:
-            for end_id in end_ids:
-                # Trouver le prochain départ
-                print(start_id)
-                departure_info = prochain_depart(stop_times_filename, start_id, current_date, current_time_sec)
-
-
-                if not departure_info:
-                    continue
-
-                dep_time_sec = parse_time(departure_info['departure_time'])
-                path, duration = dijkstra(graph, start_id, end_id)
-
-                if path and dep_time_sec + duration < best_duration:
-                    best_path = path
-                    best_duration = duration
-                    best_departure = departure_info
+            departure_info = departure_index.prochain_depart(start_id, current_date, current_time_sec)
+            if departure_info:
+                departures[start_id] = departure_info
+
+        # Une seule recherche depuis toutes les gares de départ vers toutes les gares d'arrivée.
+        # Coût initial en secondes depuis minuit le jour current_date : un départ un jour suivant
+        # (service_date) compte les journées d'écart, et ne passe pas devant un départ du jour même
+        sources = {
+            start_id: parse_time(info['departure_time'])
+                      + (date.fromisoformat(info['service_date']) - current_date).days * 86400
+            for start_id, info in departures.items()
+        }
+        if timetable is not None and engine == "ch":
+            best_path, arrival_sec, best_start, best_end = timetable.ch.query(sources, end_ids)
+        elif timetable is not None and engine == "astar":
+            best_path, arrival_sec, best_start, best_end = timetable.csr.astar(sources, end_ids)
+        elif timetable is not None:
+            best_path, arrival_sec, best_start, best_end = timetable.spt_cache.dijkstra(sources, end_ids)
+        else:
+            best_path, arrival_sec, best_start, best_end = graph.dijkstra(sources, end_ids)
 
         if not best_path:
             print(f"Aucun itinéraire trouvé pour l'étape {i + 1}.")
             return None, None, None
 
-        # Mise à jour pour la prochaine étape
+        best_duration = arrival_sec - sources[best_start]
+        best_departure = departures[best_start]
+
+        # Mise à jour pour la prochaine étape, qui part de la gare atteinte
         full_path.extend(best_path[:-1])  # Éviter de répéter le dernier arrêt
         total_duration += best_duration
         next_departure_time = best_departure['departure_time']
         current_time_sec += best_duration
+        start_ids = [best_end]
 
     # Ajouter le dernier arrêt
-    full_path.append(all_stops[-1][0])
+    full_path.append(start_ids[0])
 
     # Convertir la durée totale en HH:MM:SS
-    hours = total_duration // 3600
-    minutes = (total_duration % 3600) // 60
-    seconds = total_duration % 60
-    duree_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    duree_str = format_hms(total_duration)
 
     # Convertir les stops en noms de gares
     path_names = [stops_dict.get(s, s) for s in full_path]
@@ -1,9 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import json
 import os
+import threading
+import time
 from RecordTranscribe import transcribe_and_analyze
-from Converter.converter import processPhrases
-from itinéraireTrain import itineraireTrain
+from Converter.converter import processPhrases, get_trip_classifier
+from itinéraireTrain import itineraireTrain, itineraireProfil, itinerairePareto, parse_time
+from timetable import get_timetable, reload_timetable, STOPS_FILENAME, STOP_TIMES_FILENAME
+from result_cache import TripResultCache
+from batch import route_batch, start_pool
+from model_registry import registry, CLASSIFIER_BACKEND
 from datetime import datetime, timedelta
 
 
@@ -15,15 +22,49 @@ CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
 UPLOAD_FOLDER = './uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Fenêtre maximale des profils horaires de /trips (profile_window), en minutes
+MAX_PROFILE_WINDOW_MIN = 24 * 60
+
+# Résultats récents de /trips, vidés automatiquement au changement de flux GTFS
+trip_cache = TripResultCache()
+
+# Un worker de /trips/batch recréé par forkserver ou spawn réimporte ce fichier sous le nom __mp_main__
+# (voir batch.start_pool) : rien n'y est démarré
+if __name__ != '__mp_main__':
+    # Chargement des horaires et du graphe une seule fois au démarrage
+    get_timetable(STOPS_FILENAME, STOP_TIMES_FILENAME)
+
+    # Workers de /trips/batch, créés avant le premier thread (voir batch.start_pool)
+    start_pool(stops_filename=STOPS_FILENAME, stop_times_filename=STOP_TIMES_FILENAME)
+
+    # Préchauffage des modèles de langage en arrière-plan : le serveur démarre tout de suite,
+    # et une requête arrivée avant la fin attend simplement le chargement en cours
+    threading.Thread(target=registry.warm_up, args=(['nlp', 'classifier'],), daemon=True).start()
+
 @app.route('/trips', methods=['POST'])
 def trips():
     transcriptionMessage = ""
+    # Analyse spaCy de la transcription, réutilisée par processPhrases
+    transcriptionDoc = None
     # Vérifiez si le contenu est JSON
     if request.is_json:
         data = request.get_json()
         message = data.get('message', None)
+        # Fenêtre de départ en minutes : renvoie tous les trajets non dominés au lieu du seul plus rapide
+        profile_window = data.get('profile_window', None)
+        if 'profile_window' in data and (
+                isinstance(profile_window, bool) or not isinstance(profile_window, int)
+                or not 0 < profile_window <= MAX_PROFILE_WINDOW_MIN):
+            return jsonify({"error": f"'profile_window' must be an integer number of minutes "
+                                     f"between 1 and {MAX_PROFILE_WINDOW_MIN}"}), 400
+        # Compromis arrivée / nombre de correspondances au lieu du seul trajet le plus rapide
+        pareto = data.get('pareto', False)
+        if not isinstance(pareto, bool):
+            return jsonify({"error": "'pareto' must be a boolean"}), 400
     else:
         message = None
+        profile_window = None
+        pareto = False
 
     # Vérifiez si un fichier est envoyé
     audio_file = request.files.get('audio_file', None)
@@ -41,7 +82,8 @@ def trips():
         try:
             # Appelez la fonction de transcription et d'analyse depuis RecordTranscribe.py
             result = transcribe_and_analyze(temp_filename)
-            transcriptionMessage = result["transcription"]  
+            transcriptionMessage = result["transcription"]
+            transcriptionDoc = result["doc"]
 
         finally:
             # Supprimez le fichier temporaire après traitement
@@ -50,33 +92,80 @@ def trips():
 
     if message:
         transcriptionMessage = message
+        transcriptionDoc = None
 
-    processed_message = processPhrases(transcriptionMessage)
+    processed_message = processPhrases(transcriptionMessage, transcriptionDoc)
    
 
     if processed_message is not None:
         
         lieu_depart, lieu_arrivee, lieux_intermediaires, departure_stations, arrival_stations = processed_message
     
-        # Paramètres par défaut ou récupérés depuis les paramètres de requête
-        stops_filename = os.path.join(os.path.dirname(__file__), '../dataSncf/stops.txt')
-        stop_times_filename = os.path.join(os.path.dirname(__file__), '../dataSncf/stop_times.txt')
+        # Horaires et graphe partagés (chargés au démarrage)
+        timetable = get_timetable()
 
          # Date et heure actuelles
         now = datetime.now()
         current_date = now.date()
         current_time_sec = now.hour * 3600 + now.minute * 60 + now.second
 
-        # 1) Calcul de l'itinéraire le plus rapide (simple)
-        path_names, duree_str, next_dep_time  = itineraireTrain(
-            stops_filename, 
-            stop_times_filename, 
-            lieu_depart.lower(), 
-            lieu_arrivee.lower(),
-            current_date,
-            current_time_sec,
-            lieux_intermediaires
-        )
+        if profile_window is not None:
+            if lieux_intermediaires:
+                return jsonify({"error": "Le profil horaire ne gère pas les étapes intermédiaires."}), 200
+            profile = itineraireProfil(
+                timetable.stops_filename,
+                timetable.stop_times_filename,
+                lieu_depart.lower(),
+                lieu_arrivee.lower(),
+                current_date,
+                current_time_sec,
+                current_time_sec + profile_window * 60,
+                timetable=timetable
+            )
+            if not profile:
+                return jsonify({"error": "Aucun itinéraire trouvé."}), 200
+            return jsonify({"itineraires": [
+                {"itineraire": " -> ".join(path_names), "duree": duree_str, "depart": depart, "arrivee": arrivee}
+                for path_names, duree_str, depart, arrivee in profile
+            ]})
+
+        if pareto:
+            if lieux_intermediaires:
+                return jsonify({"error": "Le compromis correspondances ne gère pas les étapes intermédiaires."}), 200
+            front = itinerairePareto(
+                timetable.stops_filename,
+                timetable.stop_times_filename,
+                lieu_depart.lower(),
+                lieu_arrivee.lower(),
+                current_date,
+                current_time_sec,
+                timetable=timetable
+            )
+            if not front:
+                return jsonify({"error": "Aucun itinéraire trouvé."}), 200
+            return jsonify({"itineraires": [
+                {"itineraire": " -> ".join(path_names), "duree": duree_str, "depart": depart, "arrivee": arrivee,
+                 "correspondances": correspondances}
+                for path_names, duree_str, depart, arrivee, correspondances in front
+            ]})
+
+        # 1) Calcul de l'itinéraire le plus rapide (simple), sauf s'il a été demandé récemment
+        cache_key = trip_cache.make_key(lieu_depart, lieu_arrivee, lieux_intermediaires, current_date, current_time_sec)
+        result = trip_cache.get(cache_key, timetable.feed_version)
+        if result is None:
+            start = time.perf_counter()
+            result = itineraireTrain(
+                timetable.stops_filename,
+                timetable.stop_times_filename,
+                lieu_depart.lower(),
+                lieu_arrivee.lower(),
+                current_date,
+                current_time_sec,
+                lieux_intermediaires,
+                timetable=timetable
+            )
+            trip_cache.put(cache_key, result, timetable.feed_version, time.perf_counter() - start)
+        path_names, duree_str, next_dep_time = result
 
         if path_names is None:
             return jsonify({"error": "Aucun itinéraire trouvé."}), 200
@@ -90,5 +179,64 @@ def trips():
         return jsonify({"error": "Je n'ai pas compris votre message, veuillez réessayer."}), 200
     
 
+@app.route('/timetable/reload', methods=['POST'])
+def timetable_reload():
+    # Recharge les fichiers GTFS (ex : après scriptDowloadDataSncf.py) sans redémarrer le serveur
+    timetable = reload_timetable()
+    return jsonify({
+        "stops": len(timetable.stops_dict),
+        "trips": len(timetable.trip_stop_map),
+        "graph": timetable.graph_stats
+    })
+
+
+@app.route('/trips/batch', methods=['POST'])
+def trips_batch():
+    """
+    Calcule de nombreux trajets en parallèle (voir batch.route_batch).
+    Corps JSON : {"trips": [{"depart": ..., "arrivee": ..., "etapes": [...], "date": "YYYY-MM-DD",
+    "heure": "HH:MM:SS"}, ...]} (date et heure par défaut : maintenant).
+    Réponse en NDJSON : une ligne par trajet, dans l'ordre, envoyée dès qu'elle est calculée.
+    """
+    data = request.get_json(silent=True) or {}
+    trips = data.get('trips')
+    if not isinstance(trips, list):
+        return jsonify({"error": "'trips' (list) is required"}), 400
+
+    now = datetime.now()
+    items = []
+    for trip in trips:
+        try:
+            current_date = datetime.strptime(trip['date'], "%Y-%m-%d").date() if trip.get('date') else now.date()
+            current_time_sec = parse_time(trip.get('heure') or now.strftime("%H:%M:%S"))
+            items.append((trip['depart'], trip['arrivee'], current_date, current_time_sec, trip.get('etapes')))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # Trajet mal formé : erreur renvoyée à sa place, sans bloquer les autres
+            items.append({"error": f"Trajet invalide : {type(e).__name__}: {e}"})
+
+    valid_items = [item for item in items if isinstance(item, tuple)]
+
+    def generate():
+        results = route_batch(valid_items) if valid_items else iter(())
+        for item in items:
+            result = next(results) if isinstance(item, tuple) else item
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Efficacité des caches (résultats de /trips, arbres de plus courts chemins), coût des modèles
+    # et regroupement des phrases du classifieur (taille des lots, attente en file)
+    return jsonify({
+        "trip_cache": trip_cache.stats(),
+        "spt_cache": get_timetable().spt_cache.stats(),
+        "models": registry.report(),
+        "classifier_backend": CLASSIFIER_BACKEND,
+        "classifier_batches": get_trip_classifier().stats()
+    })
+
+
 if __name__ == '__main__':
     app.run(debug=True)
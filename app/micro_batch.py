@@ -0,0 +1,90 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Taille maximale d'un lot
+DEFAULT_MAX_BATCH_SIZE = 16
+
+# Attente maximale après la première entrée d'un lot avant de le lancer, en millisecondes
+DEFAULT_MAX_WAIT_MS = 5
+
+
+class MicroBatcher:
+    """
+    Regroupe les entrées soumises par des requêtes concurrentes en lots traités d'un seul appel
+    (ex : une passe avant du classifieur sur des phrases complétées par du padding).
+    Un thread dédié attend la première entrée, puis complète le lot jusqu'à `max_batch_size`
+    entrées ou `max_wait_ms` millisecondes ; `process_batch(entrées)` doit retourner
+    un résultat par entrée, dans l'ordre. Chaque appelant attend le sien via un Future.
+    """
+
+    def __init__(self, process_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_sec = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_wait_sec = 0.0
+        self.max_wait_seen_sec = 0.0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Ajoute `item` au prochain lot ; retourne un Future de son résultat."""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item):
+        """Soumet `item` et attend son résultat."""
+        return self.submit(item).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait_sec
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            waits = [started - submitted for _, _, submitted in batch]
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.total_wait_sec += sum(waits)
+                self.max_wait_seen_sec = max(self.max_wait_seen_sec, max(waits))
+
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Nombre de lots, taille moyenne et maximale, attente moyenne et maximale en file (ms)."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "mean_queue_wait_ms": round(self.total_wait_sec * 1000 / self.items, 2) if self.items else 0.0,
+                "max_queue_wait_ms": round(self.max_wait_seen_sec * 1000, 2),
+                "queued": self._queue.qsize(),
+            }
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+
+# Modèle de classification des trajets (entraîné par deepLearning.py), surchargeable par variable d'environnement
+CLASSIFIER_PATH = os.environ.get(
+    'TRIP_CLASSIFIER_PATH', os.path.join(os.path.dirname(__file__), '../target/fine-tuned-bert'))
+
+# Exécution du classifieur : 'fp32' (modèle d'origine) ou 'int8' (couches linéaires quantifiées
+# dynamiquement en int8, sur CPU ; voir quantize_classifier)
+CLASSIFIER_BACKENDS = ('fp32', 'int8')
+CLASSIFIER_BACKEND = os.environ.get('TRIP_CLASSIFIER_BACKEND', 'fp32')
+
+# Phrases annotées (colonnes Sentence, Is Trip) générées par phrase_generator.py
+TEST_PHRASES_FILENAME = os.path.join(os.path.dirname(__file__), '../test_phrases.csv')
+
+SPACY_MODEL = 'fr_core_news_lg'
+WHISPER_MODEL = 'medium'
+
+# Phrase utilisée pour la passe de préchauffage
+WARMUP_PHRASE = "Je voudrais aller de Strasbourg à Saverne en passant par Brumath."
+
+
+def _rss_bytes():
+    """Mémoire résidente du processus (psutil si disponible, sinon /proc), ou None."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Registre des modèles du traitement du langage, partagé par tous les modules du processus :
+    chaque modèle est chargé à sa première utilisation (get), une seule fois même si plusieurs
+    requêtes le demandent en même temps. warm_up charge et exerce les modèles à l'avance ;
+    report donne pour chacun le temps de chargement, la mémoire ajoutée et le temps de préchauffage.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._warmups = {}
+        self._models = {}
+        self._locks = {}
+        self._stats = {}
+
+    def register(self, name, loader, warmup=None):
+        """
+        Déclare le modèle `name` : `loader()` le construit, `warmup(modèle)` (optionnel)
+        l'exécute une fois sur une entrée représentative.
+        """
+        self._loaders[name] = loader
+        self._warmups[name] = warmup
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """Retourne le modèle `name`, en le chargeant au premier appel."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                model = self._loaders[name]()
+                load_sec = time.perf_counter() - start
+                rss_after = _rss_bytes()
+                self._stats[name] = {
+                    "load_sec": round(load_sec, 3),
+                    "memory_mb": round((rss_after - rss_before) / 1e6, 1) if rss_before is not None else None,
+                }
+                self._models[name] = model
+        return model
+
+    def warm_up(self, names=None):
+        """Charge les modèles `names` (tous par défaut) et leur fait traiter une première entrée."""
+        for name in names or list(self._loaders):
+            model = self.get(name)
+            warmup = self._warmups[name]
+            if warmup is not None:
+                start = time.perf_counter()
+                warmup(model)
+                self._stats[name]["warmup_sec"] = round(time.perf_counter() - start, 3)
+
+    def report(self):
+        """Statistiques des modèles déjà chargés : {nom: {load_sec, memory_mb, warmup_sec}}."""
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+def _load_spacy():
+    import spacy
+    spacy.prefer_gpu()
+    return spacy.load(SPACY_MODEL)
+
+
+def quantize_classifier(model):
+    """
+    Quantification dynamique int8 des couches linéaires (poids en int8, activations quantifiées
+    à la volée) : l'essentiel du calcul de BERT sur CPU. Le modèle reste sur CPU.
+    """
+    import torch
+
+    return torch.quantization.quantize_dynamic(model.to('cpu').eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_classifier(backend=None):
+    """(tokenizer, modèle, device) du classifieur de validité des trajets, pour `backend` (CLASSIFIER_BACKEND par défaut)."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    backend = backend or CLASSIFIER_BACKEND
+    if backend not in CLASSIFIER_BACKENDS:
+        raise ValueError(f"Backend du classifieur inconnu : {backend} (attendu : {', '.join(CLASSIFIER_BACKENDS)})")
+
+    tokenizer = AutoTokenizer.from_pretrained(CLASSIFIER_PATH)
+    model = AutoModelForSequenceClassification.from_pretrained(CLASSIFIER_PATH)
+    model.eval()
+    if backend == 'int8':
+        # Les noyaux int8 dynamiques n'existent que sur CPU
+        return tokenizer, quantize_classifier(model), torch.device('cpu')
+
+    # Move the model to the appropriate device (GPU or CPU)
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    model = model.to(device)
+    return tokenizer, model, device
+
+
+def _warmup_classifier(classifier):
+    import torch
+
+    tokenizer, model, device = classifier
+    inputs = tokenizer(WARMUP_PHRASE, return_tensors='pt', truncation=True, padding=True, max_length=128)
+    with torch.no_grad():
+        model(**{key: value.to(device) for key, value in inputs.items()})
+
+
+def _load_whisper():
+    from faster_whisper import WhisperModel
+    return WhisperModel(WHISPER_MODEL, device="CPU", compute_type="int8")
+
+
+registry = ModelRegistry()
+registry.register('nlp', _load_spacy, warmup=lambda nlp: nlp(WARMUP_PHRASE))
+registry.register('classifier', _load_classifier, warmup=_warmup_classifier)
+registry.register('whisper', _load_whisper)
+
+
+def _predict(classifier, phrases, batch_size):
+    import torch
+
+    tokenizer, model, device = classifier
+    predictions = []
+    for i in range(0, len(phrases), batch_size):
+        inputs = tokenizer(phrases[i:i + batch_size], return_tensors='pt', truncation=True, padding=True, max_length=128)
+        with torch.no_grad():
+            logits = model(**{key: value.to(device) for key, value in inputs.items()}).logits
+        predictions.extend(logits.argmax(-1).tolist())
+    return predictions
+
+
+def main():
+    # Parité et latence des deux backends du classifieur sur test_phrases.csv : exactitude de chacun,
+    # taux d'accord int8 / fp32, temps par phrase seule et par lot de 16 (comme le micro-batching)
+    import csv
+    import sys
+    import time
+
+    import torch
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else TEST_PHRASES_FILENAME
+    with open(filename, mode='r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    phrases = [row['Sentence'] for row in rows]
+    labels = [int(row['Is Trip']) for row in rows]
+    print(f"{len(phrases)} phrases de test ({filename})")
+
+    # Comparaison à nombre de threads égal, fp32 sur CPU comme int8
+    results = {}
+    for backend in CLASSIFIER_BACKENDS:
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        tokenizer, model, _ = _load_classifier(backend)
+        classifier = (tokenizer, model.to('cpu'), torch.device('cpu'))
+        load_sec = time.perf_counter() - start
+        memory_mb = (_rss_bytes() - rss_before) / 1e6 if rss_before is not None else float('nan')
+
+        _predict(classifier, phrases[:16], 16)
+        start = time.perf_counter()
+        single = _predict(classifier, phrases, 1)
+        single_ms = (time.perf_counter() - start) * 1000 / len(phrases)
+        start = time.perf_counter()
+        batched = _predict(classifier, phrases, 16)
+        batched_ms = (time.perf_counter() - start) * 1000 / len(phrases)
+
+        accuracy = sum(p == y for p, y in zip(batched, labels)) / len(labels)
+        results[backend] = batched
+        print(f"{backend} : exactitude {accuracy:.4f}, chargement {load_sec:.1f} s, mémoire +{memory_mb:.0f} Mo, "
+              f"{single_ms:.1f} ms / phrase seule, {batched_ms:.1f} ms / phrase par lots de 16")
+        if single != batched:
+            print(f"{backend} : {sum(a != b for a, b in zip(single, batched))} prédictions changent avec le padding des lots")
+
+    agreement = sum(a == b for a, b in zip(results['fp32'], results['int8'])) / len(phrases)
+    print(f"Accord int8 / fp32 : {agreement:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import re
+from collections import defaultdict
+
+from Converter.fct_utils import normalize_str
+
+# Taille des n-grammes de l'index inversé
+NGRAM = 3
+
+# Rang des correspondances, du meilleur au moins bon : WORD_PREFIX quand la requête est
+# un ou plusieurs mots entiers en tête du nom ("LILLE" -> "LILLE EUROPE"), PREFIX quand
+# elle s'arrête au milieu d'un mot ("LILLE" -> "LILLERS")
+EXACT, WORD_PREFIX, PREFIX, SUBSTRING = 0, 1, 2, 3
+
+# Clé des feuilles du trie (aucun caractère ne vaut None)
+_END = None
+
+
+def normalize_name(name):
+    """
+    Normalise un nom de gare : accents retirés et majuscules (comme fct_utils.normalize_str),
+    ponctuation (tirets, apostrophes...) remplacée par des espaces.
+    Ex : "Saint-Étienne Châteaucreux" -> "SAINT ETIENNE CHATEAUCREUX".
+    """
+    return ' '.join(re.findall(r'[A-Z0-9]+', normalize_str(name)))
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class StationNameIndex:
+    """
+    Index des noms de gares, construit une fois par flux GTFS à partir de name_to_id :
+      - dictionnaire des noms normalisés (correspondance exacte)
+      - trie des noms normalisés (le nom commence par la requête)
+      - index inversé de trigrammes (la requête apparaît dans le nom)
+    Remplace le parcours de toutes les clés de name_to_id avec `name in stop_name`.
+    """
+
+    def __init__(self, name_to_id):
+        self.names = []     # noms normalisés
+        self.stop_ids = []  # stop_ids de chaque nom normalisé
+        self.exact = {}
+
+        for stop_name, stop_ids in name_to_id.items():
+            key = normalize_name(stop_name)
+            if key not in self.exact:
+                self.exact[key] = len(self.names)
+                self.names.append(key)
+                self.stop_ids.append([])
+            self.stop_ids[self.exact[key]].extend(stop_ids)
+
+        self.trie = {}
+        self.ngram_index = defaultdict(set)
+        for n, name in enumerate(self.names):
+            node = self.trie
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node.setdefault(_END, []).append(n)
+            for gram in _ngrams(name):
+                self.ngram_index[gram].add(n)
+
+    def _prefix_matches(self, query):
+        node = self.trie
+        for ch in query:
+            node = node.get(ch)
+            if node is None:
+                return []
+        matches = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key is _END:
+                    matches.extend(child)
+                else:
+                    stack.append(child)
+        return matches
+
+    def _substring_matches(self, query):
+        if len(query) < NGRAM:
+            candidates = range(len(self.names))
+        else:
+            # Intersection des listes de trigrammes, en commençant par la plus courte
+            postings = sorted((self.ngram_index.get(g, set()) for g in _ngrams(query)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    return []
+        # Les trigrammes ne garantissent pas la contiguïté : vérification finale
+        return [n for n in candidates if query in self.names[n]]
+
+    def search(self, query):
+        """
+        Retourne les correspondances de `query` sous forme de liste (rang, nom normalisé, stop_ids),
+        triée par rang (EXACT, WORD_PREFIX, PREFIX, SUBSTRING) puis par longueur du nom.
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        ranks = {}
+        for n in self._substring_matches(query):
+            ranks[n] = SUBSTRING
+        for n in self._prefix_matches(query):
+            ranks[n] = WORD_PREFIX if self.names[n].startswith(query + ' ') else PREFIX
+        n = self.exact.get(query)
+        if n is not None:
+            ranks[n] = EXACT
+
+        ordered = sorted(ranks, key=lambda n: (ranks[n], len(self.names[n]), self.names[n]))
+        return [(ranks[n], self.names[n], self.stop_ids[n]) for n in ordered]
+
+    def resolve(self, query):
+        """
+        Les stop_ids du meilleur rang trouvé seulement : "Metz" donne la gare de Metz
+        et non Metzeral, "Lyon" les gares de Lyon et non Paris Gare de Lyon,
+        "Lille" Lille Europe et Lille Flandres et non Lillers.
+        """
+        matches = self.search(query)
+        if not matches:
+            return []
+        best_rank = matches[0][0]
+        return [stop_id for rank, _, stop_ids in matches if rank == best_rank for stop_id in stop_ids]
@@ -0,0 +1,231 @@
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+INF = float('inf')
+
+# Nombre maximal de trains empruntés (donc MAX_ROUNDS - 1 correspondances)
+MAX_ROUNDS = 10
+
+# Temps minimal de correspondance à un même arrêt (transfers.txt est vide dans le flux TER)
+MIN_TRANSFER_SEC = 0
+
+# Un tronçon effectué dans un même train
+Leg = namedtuple('Leg', ['trip_id', 'from_stop', 'departure_time', 'to_stop', 'arrival_time', 'stops'])
+
+# Un itinéraire complet : heure de départ, heure d'arrivée, tronçons successifs
+Journey = namedtuple('Journey', ['departure_time', 'arrival_time', 'legs'])
+
+
+class RoutePattern:
+    """
+    Ensemble de trips desservant exactement la même suite d'arrêts, sans dépassement :
+    pour chaque position, les départs sont croissants d'un trip au suivant.
+    Les horaires sont stockés par colonne (dep_by_pos[pos][trip]) pour la recherche dichotomique.
+    """
+
+    def __init__(self, stops):
+        self.stops = stops
+        self.trip_ids = []
+        self.arr_by_pos = [[] for _ in stops]
+        self.dep_by_pos = [[] for _ in stops]
+
+    def accepts(self, arrs, deps):
+        """Vrai si le trip peut être ajouté en dernier sans dépasser le trip précédent."""
+        if not self.trip_ids:
+            return True
+        return all(
+            deps[pos] >= self.dep_by_pos[pos][-1] and arrs[pos] >= self.arr_by_pos[pos][-1]
+            for pos in range(len(self.stops))
+        )
+
+    def add_trip(self, trip_id, arrs, deps):
+        self.trip_ids.append(trip_id)
+        for pos in range(len(self.stops)):
+            self.arr_by_pos[pos].append(arrs[pos])
+            self.dep_by_pos[pos].append(deps[pos])
+
+    def earliest_trip(self, pos, time, active_trips=None):
+        """Indice du premier trip partant de la position `pos` à `time` ou après, ou None."""
+        deps = self.dep_by_pos[pos]
+        t = bisect_left(deps, time)
+        while t < len(deps):
+            if active_trips is None or self.trip_ids[t] in active_trips:
+                return t
+            t += 1
+        return None
+
+
+class RaptorNetwork:
+    """
+    Réseau pour l'algorithme RAPTOR (Round-bAsed Public Transit Optimized Router) :
+    les trips de trip_stop_map sont regroupés en RoutePattern, et chaque arrêt connaît
+    les (pattern, position) qui le desservent. Une requête parcourt les patterns tour par tour
+    (un tour = un train de plus) sans file de priorité.
+    """
+
+    def __init__(self, trip_stop_map):
+        by_stops = defaultdict(list)
+        for trip_id, stops_info in trip_stop_map.items():
+            stops = tuple(s[0] for s in stops_info)
+            arrs = []
+            deps = []
+            for _, _, arr_sec, dep_sec in stops_info:
+                # Un horaire manquant est remplacé par l'autre horaire du même arrêt
+                arr = arr_sec if arr_sec is not None else dep_sec
+                dep = dep_sec if dep_sec is not None else arr_sec
+                if arr is None:
+                    break
+                arrs.append(arr)
+                deps.append(dep)
+            else:
+                if len(stops) >= 2:
+                    by_stops[stops].append((deps[0], trip_id, arrs, deps))
+
+        self.patterns = []
+        for stops, trips in by_stops.items():
+            trips.sort(key=lambda x: x[0])
+            # Un trip qui en dépasse un autre part dans un nouveau pattern
+            stop_patterns = []
+            for _, trip_id, arrs, deps in trips:
+                for pattern in stop_patterns:
+                    if pattern.accepts(arrs, deps):
+                        break
+                else:
+                    pattern = RoutePattern(stops)
+                    stop_patterns.append(pattern)
+                pattern.add_trip(trip_id, arrs, deps)
+            self.patterns.extend(stop_patterns)
+
+        self.stop_patterns = defaultdict(list)
+        for p, pattern in enumerate(self.patterns):
+            for pos, stop_id in enumerate(pattern.stops):
+                self.stop_patterns[stop_id].append((p, pos))
+
+    def earliest_arrival(self, source_ids, target_ids, departure_time, active_trips=None,
+                         max_rounds=MAX_ROUNDS, min_transfer_sec=MIN_TRANSFER_SEC):
+        """
+        Cherche l'arrivée au plus tôt à l'un des `target_ids` en partant de l'un des `source_ids`
+        à `departure_time` (secondes depuis minuit).
+        `active_trips` (ensemble de trip_id) restreint les trips utilisables, ex : ceux circulant ce jour.
+        Retourne un Journey ou None si aucun itinéraire n'est trouvé.
+        """
+        parents, front = self._rounds(source_ids, target_ids, departure_time, active_trips,
+                                      max_rounds, min_transfer_sec)
+        if not front:
+            return None
+        k, target, _ = front[-1]
+        return self._reconstruct(parents[:k], target)
+
+    def pareto_journeys(self, source_ids, target_ids, departure_time, active_trips=None,
+                        max_rounds=MAX_ROUNDS, min_transfer_sec=MIN_TRANSFER_SEC):
+        """
+        Front de Pareto (heure d'arrivée, nombre de correspondances) : pour chaque nombre de trains
+        k <= max_rounds, le trajet le plus rapide en k trains s'il arrive strictement plus tôt
+        que tous ceux qui en prennent moins. Même recherche qu'earliest_arrival : le tour k
+        donne l'arrivée au plus tôt en k trains, et les étiquettes qui n'améliorent ni l'arrêt
+        ni l'arrivée à la cible sont élaguées.
+        Retourne une liste de Journey, du moins de correspondances au plus rapide.
+        """
+        parents, front = self._rounds(source_ids, target_ids, departure_time, active_trips,
+                                      max_rounds, min_transfer_sec)
+        return [self._reconstruct(parents[:k], target) for k, target, _ in front]
+
+    def _rounds(self, source_ids, target_ids, departure_time, active_trips, max_rounds, min_transfer_sec):
+        """
+        Tours RAPTOR communs à earliest_arrival et pareto_journeys.
+        Retourne (parents, front) : parents[k - 1][stop] = (pattern, trip, position de montée,
+        position de descente) pour les arrêts améliorés au tour k, et front la liste des
+        (k, cible, arrivée) pour chaque tour qui améliore l'arrivée à la cible.
+        """
+        targets = set(target_ids)
+        best = defaultdict(lambda: INF)  # meilleure arrivée tous tours confondus
+        previous_round = {}
+        for stop_id in source_ids:
+            previous_round[stop_id] = departure_time
+            best[stop_id] = departure_time
+        marked = set(previous_round)
+
+        # parents[k][stop] = (pattern, trip, position de montée, position de descente)
+        parents = []
+        best_target_arrival = min((best[t] for t in targets), default=INF)
+        front = []
+
+        for k in range(1, max_rounds + 1):
+            # Patterns à parcourir, depuis la première position marquée
+            queue = {}
+            for stop_id in marked:
+                for p, pos in self.stop_patterns.get(stop_id, ()):
+                    if pos < queue.get(p, INF):
+                        queue[p] = pos
+
+            current_round = {}
+            round_parents = {}
+            marked = set()
+            transfer = min_transfer_sec if k > 1 else 0
+
+            for p, start_pos in queue.items():
+                pattern = self.patterns[p]
+                trip = None
+                board_pos = None
+                for pos in range(start_pos, len(pattern.stops)):
+                    stop_id = pattern.stops[pos]
+
+                    if trip is not None:
+                        arr = pattern.arr_by_pos[pos][trip]
+                        if arr < best[stop_id] and arr < best_target_arrival:
+                            best[stop_id] = arr
+                            current_round[stop_id] = arr
+                            round_parents[stop_id] = (p, trip, board_pos, pos)
+                            marked.add(stop_id)
+                            if stop_id in targets:
+                                best_target_arrival = arr
+
+                    # Peut-on prendre un trip plus tôt à cet arrêt ?
+                    prev_arr = previous_round.get(stop_id)
+                    if prev_arr is None:
+                        continue
+                    ready = prev_arr + transfer
+                    if trip is None or ready <= pattern.dep_by_pos[pos][trip]:
+                        earlier = pattern.earliest_trip(pos, ready, active_trips)
+                        if earlier is not None and (trip is None or earlier < trip):
+                            trip = earlier
+                            board_pos = pos
+
+            parents.append(round_parents)
+            improved = [t for t in targets if t in round_parents]
+            if improved:
+                target = min(improved, key=lambda t: best[t])
+                front.append((k, target, best[target]))
+            if not marked:
+                break
+            # Les arrêts non améliorés gardent leur valeur du tour précédent
+            for stop_id, arr in previous_round.items():
+                current_round.setdefault(stop_id, arr)
+            previous_round = current_round
+
+        return parents, front
+
+    def _reconstruct(self, parents, target):
+        """Remonte les tours depuis `target` pour reconstruire les tronçons."""
+        legs = []
+        stop_id = target
+        for k in range(len(parents) - 1, -1, -1):
+            parent = parents[k].get(stop_id)
+            if parent is None:
+                continue
+            p, trip, board_pos, alight_pos = parent
+            pattern = self.patterns[p]
+            legs.append(Leg(
+                trip_id=pattern.trip_ids[trip],
+                from_stop=pattern.stops[board_pos],
+                departure_time=pattern.dep_by_pos[board_pos][trip],
+                to_stop=pattern.stops[alight_pos],
+                arrival_time=pattern.arr_by_pos[alight_pos][trip],
+                stops=list(pattern.stops[board_pos:alight_pos + 1]),
+            ))
+            stop_id = pattern.stops[board_pos]
+
+        if not legs:
+            return None
+        legs.reverse()
+        return Journey(legs[0].departure_time, legs[-1].arrival_time, legs)
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from name_index import normalize_name
+
+# Durée de vie d'un résultat en cache, en secondes
+DEFAULT_TTL_SEC = 300
+
+# Nombre maximal de résultats gardés
+DEFAULT_MAX_ENTRIES = 1024
+
+# Largeur des tranches d'heure de départ partageant un même résultat, en secondes
+DEFAULT_BUCKET_SEC = 300
+
+
+class TripResultCache:
+    """
+    Cache des résultats d'itineraireTrain pour les trajets demandés souvent
+    (ex : Strasbourg -> Saverne plusieurs fois en quelques minutes).
+    La clé est (départ, arrivée, étapes, date de service, tranche d'heure de départ), noms normalisés
+    comme dans name_index ; les entrées expirent après `ttl_sec` et les plus anciennement utilisées
+    sont évincées au-delà de `max_entries`. Le cache est vidé dès que la feed_version change.
+    """
+
+    def __init__(self, ttl_sec=DEFAULT_TTL_SEC, max_entries=DEFAULT_MAX_ENTRIES, bucket_sec=DEFAULT_BUCKET_SEC):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.bucket_sec = bucket_sec
+        self.entries = OrderedDict()  # clé -> (résultat, expiration, durée du calcul)
+        self.feed_version = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_sec = 0.0
+        self._lock = threading.Lock()
+
+    def make_key(self, departure_name, arrival_name, intermediate_names, service_date, current_time_sec):
+        return (
+            normalize_name(departure_name),
+            normalize_name(arrival_name),
+            tuple(normalize_name(name) for name in intermediate_names or ()),
+            service_date.isoformat(),
+            current_time_sec // self.bucket_sec,
+        )
+
+    def _check_feed_version(self, feed_version):
+        # Appelé sous le verrou : un nouveau flux GTFS invalide tous les résultats
+        if feed_version != self.feed_version:
+            self.entries.clear()
+            self.feed_version = feed_version
+
+    def get(self, key, feed_version):
+        """Résultat en cache pour `key`, ou None (absent, expiré ou calculé sur un autre flux)."""
+        with self._lock:
+            self._check_feed_version(feed_version)
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_sec += entry[2]
+            return entry[0]
+
+    def put(self, key, result, feed_version, compute_sec):
+        """Enregistre `result`, calculé en `compute_sec` secondes sur le flux `feed_version`."""
+        with self._lock:
+            self._check_feed_version(feed_version)
+            self.entries[key] = (result, time.monotonic() + self.ttl_sec, compute_sec)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """Compteurs du cache : succès, échecs, taux de succès, temps de calcul économisé."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "saved_ms": round(self.saved_sec * 1000, 1),
+                "entries": len(self.entries),
+                "feed_version": self.feed_version,
+            }
@@ -0,0 +1,251 @@
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from itinéraireTrain import read_stops, build_dedup_graph
+from gtfs_source import gtfs_exists, open_gtfs
+from columnar import read_stop_times_columns, StopTimes
+from interning import Interner
+
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_DIRNAME = 'snapshot'
+META_FILENAME = 'meta.json'
+
+# Colonnes enregistrées en .npy (une par fichier, chargées en np.memmap)
+ARRAY_NAMES = [
+    'stop_ids', 'stop_names',
+    'trip_ids', 'trip_offsets',
+    'st_trip', 'st_stop', 'st_seq', 'st_arr', 'st_dep', 'st_pickup', 'st_drop_off',
+    'adj_offsets', 'adj_targets', 'adj_weights', 'adj_trip_counts',
+]
+
+
+class StaleSnapshotError(Exception):
+    """Le snapshot ne correspond pas à la feed_version des fichiers GTFS."""
+
+
+def read_feed_version(gtfs_dir):
+    """
+    Lit feed_info.txt et retourne la feed_version (ou None si absente).
+    """
+    feed_info_filename = os.path.join(gtfs_dir, 'feed_info.txt')
+    if not gtfs_exists(feed_info_filename):
+        return None
+    with open_gtfs(feed_info_filename) as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            return row.get('feed_version') or None
+    return None
+
+
+def new_build_dir(target_dir):
+    """Dossier temporaire vide à côté de `target_dir`, où écrire ce qui sera publié par publish_dir."""
+    parent = os.path.dirname(os.path.abspath(target_dir))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix=os.path.basename(target_dir) + '.build-', dir=parent)
+
+
+def publish_dir(build_dir, target_dir):
+    """
+    Remplace `target_dir` par `build_dir` complet, par renommages : aucun fichier existant n'est
+    tronqué ni réécrit. Les tableaux de l'ancienne version encore ouverts en mémoire mappée
+    (Timetable en cours d'utilisation, workers) restent valides, même une fois le dossier supprimé ;
+    réécrire un .npy mappé sur place ferait au contraire tomber le processus (SIGBUS).
+    Plusieurs processus peuvent publier en même temps : le dernier renommage l'emporte.
+    """
+    target_dir = os.path.abspath(target_dir)
+    while True:
+        old_dir = None
+        if os.path.exists(target_dir):
+            old_dir = tempfile.mkdtemp(prefix=os.path.basename(target_dir) + '.old-', dir=os.path.dirname(target_dir))
+            try:
+                # Le dossier vide créé par mkdtemp est remplacé par l'ancienne version
+                os.replace(target_dir, old_dir)
+            except FileNotFoundError:
+                # Déplacé entre-temps par une autre publication
+                os.rmdir(old_dir)
+                old_dir = None
+        try:
+            os.rename(build_dir, target_dir)
+        except OSError:
+            # Une autre publication a pris la place entre les deux renommages : on recommence
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+            continue
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        return target_dir
+
+
+def compile_snapshot(gtfs_dir, snapshot_dir=None):
+    """
+    Compile les fichiers GTFS de `gtfs_dir` en un snapshot binaire :
+      - stop_ids / trip_ids internés en entiers (position dans le tableau), dans l'ordre de
+        columnar.read_stop_times_columns, puis les arrêts de stops.txt absents de stop_times
+      - stop_times en colonnes triées par (trip, stop_sequence), découpées par trip_offsets
+        (voir columnar.StopTimes)
+      - graphe des durées (arcs parallèles fusionnés) en CSR (adj_offsets, adj_targets, adj_weights),
+        avec le nombre de trips par arc (adj_trip_counts)
+    Le snapshot est écrit dans un dossier temporaire puis publié par renommage (voir publish_dir).
+    Retourne le chemin du dossier du snapshot.
+    """
+    if snapshot_dir is None:
+        snapshot_dir = os.path.join(gtfs_dir, SNAPSHOT_DIRNAME)
+    build_dir = new_build_dir(snapshot_dir)
+
+    stops_dict, _ = read_stops(os.path.join(gtfs_dir, 'stops.txt'))
+    stop_times = read_stop_times_columns(os.path.join(gtfs_dir, 'stop_times.txt'))
+    graph, trip_counts, graph_stats = build_dedup_graph(stop_times.trip_stop_map())
+
+    # Les indices de stop_times sont conservés : les arrêts de stops.txt sans horaire sont ajoutés après
+    stops = stop_times.stops
+    for stop_id in stops_dict:
+        stops.intern(stop_id)
+
+    adj_offsets = np.zeros(len(stops) + 1, dtype=np.int64)
+    adj_targets = []
+    adj_weights = []
+    adj_trip_counts = []
+    for i, stop_id in enumerate(stops):
+        for neighbor, duration in graph.get(stop_id, ()):
+            adj_targets.append(stops.get(neighbor))
+            adj_weights.append(duration)
+            adj_trip_counts.append(trip_counts[(stop_id, neighbor)])
+        adj_offsets[i + 1] = len(adj_targets)
+
+    arrays = {
+        'stop_ids': np.array(stops.ids, dtype=str),
+        'stop_names': np.array([stops_dict.get(s, '') for s in stops], dtype=str),
+        'trip_ids': np.array(stop_times.trip_ids, dtype=str),
+        'trip_offsets': stop_times.trip_offsets,
+        'st_trip': stop_times.trip,
+        'st_stop': stop_times.stop,
+        'st_seq': stop_times.seq,
+        'st_arr': stop_times.arr,
+        'st_dep': stop_times.dep,
+        'st_pickup': stop_times.pickup,
+        'st_drop_off': stop_times.drop_off,
+        'adj_offsets': adj_offsets,
+        'adj_targets': np.array(adj_targets, dtype=np.int32),
+        'adj_weights': np.array(adj_weights, dtype=np.int32),
+        'adj_trip_counts': np.array(adj_trip_counts, dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(build_dir, name + '.npy'), array)
+
+    # meta.json est écrit en dernier : un snapshot sans meta est considéré incomplet
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'feed_version': read_feed_version(gtfs_dir),
+        'n_stops': len(stops),
+        'n_trips': len(stop_times.trip_ids),
+        'n_stop_times': len(stop_times),
+        'n_edges': len(adj_targets),
+        'graph_stats': graph_stats,
+    }
+    with open(os.path.join(build_dir, META_FILENAME), mode='w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    return publish_dir(build_dir, snapshot_dir)
+
+
+class Snapshot:
+    """
+    Snapshot binaire chargé en mémoire mappée (np.load(..., mmap_mode='r')) :
+    l'ouverture ne lit pas les données, et plusieurs workers partagent le même cache de pages.
+    """
+
+    def __init__(self, snapshot_dir, meta, arrays):
+        self.snapshot_dir = snapshot_dir
+        self.meta = meta
+        self.feed_version = meta.get('feed_version')
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def load(cls, snapshot_dir, gtfs_dir=None):
+        """
+        Ouvre le snapshot de `snapshot_dir`.
+        Si `gtfs_dir` est fourni, vérifie que la feed_version correspond et lève
+        StaleSnapshotError sinon.
+        """
+        meta_filename = os.path.join(snapshot_dir, META_FILENAME)
+        if not os.path.exists(meta_filename):
+            raise FileNotFoundError(f"Snapshot introuvable ou incomplet : {snapshot_dir}")
+        with open(meta_filename, mode='r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            raise StaleSnapshotError(f"Format de snapshot {meta.get('format')} non supporté.")
+        if gtfs_dir is not None:
+            feed_version = read_feed_version(gtfs_dir)
+            if meta.get('feed_version') != feed_version:
+                raise StaleSnapshotError(
+                    f"Snapshot {meta.get('feed_version')} périmé (feed_version actuelle : {feed_version})."
+                )
+
+        arrays = {
+            name: np.load(os.path.join(snapshot_dir, name + '.npy'), mmap_mode='r')
+            for name in ARRAY_NAMES
+        }
+        return cls(snapshot_dir, meta, arrays)
+
+    def stop_times(self):
+        """
+        columnar.StopTimes dont les colonnes sont les tableaux mappés du snapshot (sans copie) ;
+        seuls les identifiants sont relus pour les interner.
+        """
+        return StopTimes(
+            Interner(self.trip_ids.tolist()), Interner(self.stop_ids.tolist()),
+            self.st_trip, self.st_stop, self.st_seq, self.st_arr, self.st_dep, self.st_pickup, self.st_drop_off,
+        )
+
+    def graph(self):
+        """graph[stop_id] = [(autre_stop_id, duree), ...] et trip_counts[(s1, s2)], comme build_dedup_graph."""
+        stop_ids = self.stop_ids.tolist()
+        offsets = self.adj_offsets.tolist()
+        targets = self.adj_targets.tolist()
+        weights = self.adj_weights.tolist()
+        counts = self.adj_trip_counts.tolist()
+        graph = {}
+        trip_counts = {}
+        for i, stop_id in enumerate(stop_ids):
+            start, end = offsets[i], offsets[i + 1]
+            if start == end:
+                continue
+            graph[stop_id] = [(stop_ids[v], w) for v, w in zip(targets[start:end], weights[start:end])]
+            for v, count in zip(targets[start:end], counts[start:end]):
+                trip_counts[(stop_id, stop_ids[v])] = count
+        return graph, trip_counts
+
+
+def load_or_compile_snapshot(gtfs_dir, snapshot_dir=None):
+    """
+    Ouvre le snapshot de `gtfs_dir`, en le (re)compilant s'il est absent ou périmé.
+    """
+    if snapshot_dir is None:
+        snapshot_dir = os.path.join(gtfs_dir, SNAPSHOT_DIRNAME)
+    try:
+        return Snapshot.load(snapshot_dir, gtfs_dir)
+    except (FileNotFoundError, StaleSnapshotError):
+        compile_snapshot(gtfs_dir, snapshot_dir)
+        return Snapshot.load(snapshot_dir, gtfs_dir)
+
+
+def main():
+    # Usage : python snapshot.py [dossier_gtfs] [dossier_snapshot]
+    gtfs_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), '../dataSncf')
+    snapshot_dir = sys.argv[2] if len(sys.argv) > 2 else None
+
+    snapshot_dir = compile_snapshot(gtfs_dir, snapshot_dir)
+    snapshot = Snapshot.load(snapshot_dir, gtfs_dir)
+    print(f"Snapshot compilé dans {snapshot_dir} :", json.dumps(snapshot.meta))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import heapq
+import threading
+from collections import deque, OrderedDict
+
+import numpy as np
+
+INF = float('inf')
+
+# Mémoire maximale occupée par les arbres en cache (un arbre ~ 12 octets par arrêt)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Nombre de requêtes depuis une même source à partir duquel son arbre est calculé
+DEFAULT_MIN_REQUESTS = 2
+
+# Nombre maximal de sources dont les requêtes sont comptées (les plus anciennes sont oubliées)
+MAX_TRACKED_SOURCES = 4096
+
+
+class ShortestPathTreeCache:
+    """
+    Cache des arbres de plus courts chemins "un vers tous" du graphe CSR (voir csr_graph.CSRGraph),
+    un par arrêt source : distances (float64) et parents (int32) indexés par arrêt.
+    Une requête dont toutes les sources ont leur arbre se contente de remonter les parents.
+    Sinon elle est calculée par CSRGraph.dijkstra, qui s'arrête à la cible : un arbre complet coûte
+    bien plus cher, et n'est calculé, en arrière-plan, que pour les sources demandées au moins
+    `min_requests` fois. Éviction LRU dès que la mémoire des arbres dépasse `max_bytes`.
+    """
+
+    def __init__(self, csr, max_bytes=DEFAULT_MAX_BYTES, min_requests=DEFAULT_MIN_REQUESTS):
+        self.csr = csr
+        self.max_bytes = max_bytes
+        self.min_requests = min_requests
+        self.trees = OrderedDict()  # indice de l'arrêt source -> (dist, parent)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._requests = OrderedDict()  # indice de l'arrêt source -> nombre de requêtes sans arbre
+        self._pending = deque()  # sources dont l'arbre reste à calculer
+        self._builder = None
+        self._lock = threading.Lock()
+
+    def _note_miss(self, source):
+        """Compte une requête sans arbre depuis `source` ; planifie son arbre au seuil. Appelé sous le verrou."""
+        if source in self.trees or source in self._pending:
+            return
+        count = self._requests.pop(source, 0) + 1
+        if count < self.min_requests:
+            self._requests[source] = count
+            if len(self._requests) > MAX_TRACKED_SOURCES:
+                self._requests.popitem(last=False)
+            return
+        self._pending.append(source)
+        if self._builder is None:
+            self._builder = threading.Thread(target=self._build_pending, daemon=True)
+            self._builder.start()
+
+    def _build_pending(self):
+        """Calcule les arbres planifiés, un par un, puis s'arrête quand il n'y en a plus."""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._builder = None
+                    return
+                source = self._pending[0]
+            tree = self._one_to_all(source)
+            size = tree[0].nbytes + tree[1].nbytes
+            with self._lock:
+                self._pending.popleft()
+                self.trees[source] = tree
+                self.nbytes += size
+                while self.nbytes > self.max_bytes and len(self.trees) > 1:
+                    _, (dist, parent) = self.trees.popitem(last=False)
+                    self.nbytes -= dist.nbytes + parent.nbytes
+
+    def _one_to_all(self, source):
+        n = len(self.csr.stop_ids)
+        dist = [INF] * n
+        parent = [-1] * n
+        dist[source] = 0
+        heap = [(0, source)]
+        offsets = self.csr.offsets
+        targets = self.csr.targets
+        weights = self.csr.weights
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            start, end = offsets[u], offsets[u + 1]
+            for v, w in zip(targets[start:end].tolist(), weights[start:end].tolist()):
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return np.array(dist, dtype=np.float64), np.array(parent, dtype=np.int32)
+
+    def dijkstra(self, sources, goal_stop_ids):
+        """
+        Même contrat que CSRGraph.dijkstra (`sources` : dict[stop_id -> coût initial]). Si toutes
+        les sources ont leur arbre en cache : coût d'une cible = min sur les sources de
+        (coût initial + distance) ; sinon CSRGraph.dijkstra.
+        Retourne (chemin, cout_total, source, cible) ou (None, inf, None, None) si pas trouvé.
+        """
+        stop_index = self.csr.stop_index
+        origins = [(stop_index[stop_id], initial_cost) for stop_id, initial_cost in sources.items()
+                   if stop_id in stop_index]
+
+        with self._lock:
+            trees = [self.trees.get(s) for s, _ in origins]
+            if origins and all(tree is not None for tree in trees):
+                for s, _ in origins:
+                    self.trees.move_to_end(s)
+                self.hits += 1
+            else:
+                self.misses += 1
+                for s, _ in origins:
+                    self._note_miss(s)
+                trees = None
+        if trees is None:
+            return self.csr.dijkstra(sources, goal_stop_ids)
+
+        goals = [stop_index[g] for g in goal_stop_ids if g in stop_index]
+        best = (INF, None, None, None)  # (coût, source, cible, parents)
+        for (s, initial_cost), (dist, parent) in zip(origins, trees):
+            for g in goals:
+                cost = initial_cost + dist[g]
+                if cost < best[0]:
+                    best = (cost, s, g, parent)
+
+        cost, s, g, parent = best
+        if s is None:
+            return None, INF, None, None
+        path = [g]
+        while path[-1] != s:
+            path.append(int(parent[path[-1]]))
+        path.reverse()
+        stop_path = [self.csr.stop_ids[i] for i in path]
+        return stop_path, int(cost), stop_path[0], stop_path[-1]
+
+    def stats(self):
+        """Compteurs du cache, par requête : succès, échecs, taux de succès, arbres (calculés, en attente), mémoire."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "trees": len(self.trees),
+                "pending": len(self._pending),
+                "bytes": self.nbytes,
+            }
@@ -0,0 +1,142 @@
+import os
+import threading
+
+from itinéraireTrain import read_stops, read_stop_coords
+from snapshot import load_or_compile_snapshot, read_feed_version
+from departures import DepartureIndex
+from calendar_service import ServiceCalendar
+from raptor import RaptorNetwork
+from csa import ConnectionScan
+from csr_graph import CSRGraph
+from spt_cache import ShortestPathTreeCache
+from name_index import StationNameIndex
+from contraction import load_or_build_ch
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../dataSncf')
+STOPS_FILENAME = os.path.join(DATA_DIR, 'stops.txt')
+STOP_TIMES_FILENAME = os.path.join(DATA_DIR, 'stop_times.txt')
+
+
+class Timetable:
+    """
+    Données horaires chargées une seule fois et partagées entre les requêtes :
+      - feed_version : version du flux GTFS (feed_info.txt)
+      - snapshot : snapshot binaire du flux (voir snapshot.py), ouvert en mémoire mappée ;
+        colonnes de stop_times, internement des arrêts / trips et graphe CSR en sont tirés
+        sans relire stop_times.txt (il est compilé au premier lancement et à chaque nouvelle feed_version)
+      - stops_dict[stop_id] = stop_name
+      - name_to_id[stop_name] = [stop_id1, stop_id2, ...]
+      - name_index : recherche des gares par nom (voir name_index.StationNameIndex)
+      - trip_stop_map[trip_id] = [(stop_id, stop_sequence, arr_sec, dep_sec), ...]
+      - graph[stop_id] = [(autre_stop_id, duree_en_secondes), ...], arcs parallèles fusionnés
+        (durée minimale, voir build_dedup_graph ; graph_stats mesure la réduction),
+        reconstruit depuis le snapshot à la première utilisation
+      - csr : le même graphe au format CSR sur indices entiers, avec les coordonnées des arrêts
+        pour A* (voir csr_graph.CSRGraph)
+      - spt_cache : arbres de plus courts chemins par gare de départ, réutilisés d'une requête
+        à l'autre (voir spt_cache.ShortestPathTreeCache)
+      - calendar : jours de circulation des trips (voir calendar_service.ServiceCalendar)
+      - departure_index : départs triés par arrêt (voir departures.DepartureIndex)
+    Ces structures sont en lecture seule une fois construites (hormis le contenu de spt_cache).
+    """
+
+    def __init__(self, stops_filename=STOPS_FILENAME, stop_times_filename=STOP_TIMES_FILENAME):
+        self.stops_filename = stops_filename
+        self.stop_times_filename = stop_times_filename
+        gtfs_dir = os.path.dirname(stop_times_filename)
+        self.feed_version = read_feed_version(gtfs_dir)
+
+        self.stops_dict, self.name_to_id = read_stops(stops_filename)
+        self.name_index = StationNameIndex(self.name_to_id)
+        self.snapshot = load_or_compile_snapshot(gtfs_dir)
+        # Colonnes mappées (voir columnar.py) : trip_stop_map est une vue sur des tableaux
+        # d'indices internés, au format de read_stop_times
+        stop_times = self.snapshot.stop_times()
+        self.trip_stop_map = stop_times.trip_stop_map()
+        self.graph_stats = self.snapshot.meta['graph_stats']
+        self.csr = CSRGraph.from_snapshot(self.snapshot, read_stop_coords(stops_filename))
+        self.spt_cache = ShortestPathTreeCache(self.csr)
+        self.calendar = ServiceCalendar(gtfs_dir)
+        self.departure_index = DepartureIndex(stop_times, self.calendar)
+        self._graph = None
+        self._edge_trip_counts = None
+        self._raptor = None
+        self._csa = None
+        self._ch = None
+        self._ch_lock = threading.Lock()
+
+    @property
+    def graph(self):
+        """Graphe des durées en dictionnaire (voir build_dedup_graph), reconstruit à la première utilisation."""
+        if self._graph is None:
+            self._graph, self._edge_trip_counts = self.snapshot.graph()
+        return self._graph
+
+    @property
+    def edge_trip_counts(self):
+        """edge_trip_counts[(s1, s2)] = nombre de trips empruntant l'arc (voir build_dedup_graph)."""
+        if self._edge_trip_counts is None:
+            self._graph, self._edge_trip_counts = self.snapshot.graph()
+        return self._edge_trip_counts
+
+    @property
+    def raptor(self):
+        """Réseau RAPTOR (voir raptor.RaptorNetwork), construit à la première utilisation."""
+        if self._raptor is None:
+            self._raptor = RaptorNetwork(self.trip_stop_map)
+        return self._raptor
+
+    @property
+    def csa(self):
+        """Moteur CSA (voir csa.ConnectionScan), construit à la première utilisation."""
+        if self._csa is None:
+            self._csa = ConnectionScan(self.trip_stop_map)
+        return self._csa
+
+    @property
+    def ch(self):
+        """
+        Hiérarchie de contraction du graphe des durées (voir contraction.ContractionHierarchy),
+        chargée depuis dataSncf/ch ou prétraitée et enregistrée à la première utilisation.
+        Le prétraitement est long : les requêtes concurrentes attendent la première au lieu de le refaire.
+        """
+        if self._ch is None:
+            with self._ch_lock:
+                if self._ch is None:
+                    self._ch = load_or_build_ch(self.graph, os.path.dirname(self.stops_filename))
+        return self._ch
+
+
+_timetable = None
+_timetable_lock = threading.Lock()
+
+
+def get_timetable(stops_filename=STOPS_FILENAME, stop_times_filename=STOP_TIMES_FILENAME):
+    """
+    Retourne le Timetable du processus, en le chargeant au premier appel.
+    Les appels suivants réutilisent les structures déjà en mémoire.
+    """
+    global _timetable
+    with _timetable_lock:
+        if _timetable is None:
+            _timetable = Timetable(stops_filename, stop_times_filename)
+        return _timetable
+
+
+def reload_timetable(stops_filename=None, stop_times_filename=None):
+    """
+    Recharge les fichiers GTFS et remplace le Timetable partagé.
+    Le nouveau Timetable est construit hors du verrou : les requêtes en cours
+    continuent d'utiliser l'ancien jusqu'à la bascule.
+    """
+    global _timetable
+    current = _timetable
+    if stops_filename is None:
+        stops_filename = current.stops_filename if current else STOPS_FILENAME
+    if stop_times_filename is None:
+        stop_times_filename = current.stop_times_filename if current else STOP_TIMES_FILENAME
+
+    new_timetable = Timetable(stops_filename, stop_times_filename)
+    with _timetable_lock:
+        _timetable = new_timetable
+    return new_timetable
@@ -1,11 +1,19 @@
 import csv
+import os
+import sys
 from collections import defaultdict, deque
 import folium
 
+# Index des noms de gares partagé avec l'application Flask (app/name_index.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+from name_index import StationNameIndex
+from gtfs_source import open_gtfs
+from columnar import read_stop_times_columns
+
 def read_stops(stops_filename):
     stops_dict = {}
     name_to_id = defaultdict(list)
-    with open(stops_filename, mode='r', encoding='utf-8') as f:
+    with open_gtfs(stops_filename) as f:
         reader = csv.DictReader(f)
         for row in reader:
             stop_id = row['stop_id']
@@ -36,7 +44,7 @@ def read_stops_map(stops_filename):
     name_to_id = defaultdict(list)
     stop_coords = {}
 
-    with open(stops_filename, mode='r', encoding='utf-8') as f:
+    with open_gtfs(stops_filename) as f:
         reader = csv.DictReader(f)
         for row in reader:
             stop_id = row['stop_id']
@@ -72,73 +80,69 @@ def read_stops_map(stops_filename):
 
 def read_stop_times(stop_times_filename):
     """
-    Lit le fichier stop_times.txt.
-    Renvoie un dict[trip_id -> liste (stop_id, stop_sequence)] triée par stop_sequence.
+    Lit le fichier stop_times.txt en colonnes (voir app/columnar.py).
+    Renvoie un StopTimes : trips et arrêts internés en entiers (stop_times.stops),
+    lignes triées par (trip, stop_sequence).
     """
-    trip_stop_map = defaultdict(list)
-    with open(stop_times_filename, mode='r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            trip_id = row['trip_id']
-            stop_id = row['stop_id']
-            # Convertir stop_sequence en entier
-            stop_sequence = int(row['stop_sequence'])
-            trip_stop_map[trip_id].append((stop_id, stop_sequence))
+    return read_stop_times_columns(stop_times_filename)
 
-    # Tri par stop_sequence pour chaque trip
-    for t_id in trip_stop_map:
-        trip_stop_map[t_id].sort(key=lambda x: x[1])
-    return trip_stop_map
-
-def build_graph(trip_stop_map):
+def build_graph(stop_times):
     """
-    Construit un graphe bidirectionnel : dict[stop_id -> set(stop_id)].
+    Construit un graphe bidirectionnel sur les indices d'arrêts : list[set(indice)],
+    stop_times.stops[i] donnant le stop_id de l'indice i.
     Pour chaque trip, on relie les arrêts consécutifs (stop_sequence i -> i+1),
     dans les deux sens.
     """
-    graph = defaultdict(set)
-    for trip_id, stops_info in trip_stop_map.items():
-        for i in range(len(stops_info) - 1):
-            current_stop = stops_info[i][0]
-            next_stop = stops_info[i+1][0]
-            # Arête "aller"
-            graph[current_stop].add(next_stop)
-            # Arête "retour" (pour voyager dans l'autre sens)
-            graph[next_stop].add(current_stop)
+    graph = [set() for _ in range(len(stop_times.stops))]
+    # Lignes consécutives d'un même trip (les colonnes sont triées par trip puis stop_sequence)
+    same_trip = stop_times.trip[1:] == stop_times.trip[:-1]
+    current_stops = stop_times.stop[:-1][same_trip].tolist()
+    next_stops = stop_times.stop[1:][same_trip].tolist()
+    for current_stop, next_stop in zip(current_stops, next_stops):
+        # Arête "aller"
+        graph[current_stop].add(next_stop)
+        # Arête "retour" (pour voyager dans l'autre sens)
+        graph[next_stop].add(current_stop)
     return graph
 
-def bfs_shortest_path(graph, start_stop_id, goal_stop_id):
+def bfs_shortest_path(graph, start, goal):
     """
     Recherche en largeur (BFS) pour trouver le plus court chemin
-    en nombre d'arêtes entre start_stop_id et goal_stop_id.
-    Renvoie la liste [stop_id1, stop_id2, ...] ou None si pas trouvé.
+    en nombre d'arêtes entre les arrêts d'indices start et goal
+    (None si l'arrêt n'apparaît pas dans stop_times).
+    Renvoie la liste [indice1, indice2, ...] ou None si pas trouvé.
     """
-    if start_stop_id == goal_stop_id:
-        return [start_stop_id]
+    if start is None or goal is None:
+        return None
 
-    visited = set()
-    # queue contient des tuples (stop_actuel, chemin_pour_y_arriver)
-    queue = deque([(start_stop_id, [start_stop_id])])
+    # parent[arrêt] = arrêt précédent sur le plus court chemin (le chemin est reconstruit à la fin)
+    parent = {start: None}
+    queue = deque([start])
 
     while queue:
-        current_stop, path = queue.popleft()
+        current_stop = queue.popleft()
 
-        if current_stop == goal_stop_id:
+        if current_stop == goal:
+            path = [current_stop]
+            while parent[path[-1]] is not None:
+                path.append(parent[path[-1]])
+            path.reverse()
             return path
 
         for neighbor in graph[current_stop]:
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append((neighbor, path + [neighbor]))
+            if neighbor not in parent:
+                parent[neighbor] = current_stop
+                queue.append(neighbor)
 
     return None
 
-def create_map(stop_coords, graph, stops_dict):
+def create_map(stop_coords, graph, stops_dict, stops):
     """
     Construit et renvoie un objet folium.Map représentant le réseau.
     - stop_coords : dict[stop_id -> (lat, lon)]
-    - graph       : dict[stop_id -> set of stop_id]
+    - graph       : list[set of indice] (voir build_graph)
     - stops_dict  : dict[stop_id -> stop_name]
+    - stops       : indices -> stop_id (stop_times.stops)
     """
 
     # 1) Trouver un centre approximatif (moyenne des lat/lon ou un centre fixe)
@@ -165,12 +169,14 @@ def create_map(stop_coords, graph, stops_dict):
 
     # 4) Tracer les arêtes (lignes) pour visualiser les trajets
     #    Attention : cela peut faire beaucoup de lignes si la base est grande !
-    for s1, neighbors in graph.items():
+    for i, neighbors in enumerate(graph):
+        s1 = stops[i]
         if s1 not in stop_coords:
             continue  # On ne trace que si on a les coords
         lat1, lon1 = stop_coords[s1]
 
-        for s2 in neighbors:
+        for j in neighbors:
+            s2 = stops[j]
             # Pour éviter de tracer deux fois la même ligne (s1->s2 et s2->s1),
             # on peut tracer uniquement si s2 > s1 (ou un autre critère).
             # Ou alors on trace tout (ce qui double les segments).
@@ -197,10 +203,10 @@ def main():
 
     # Lecture de stops.txt => (stop_id -> stop_name), (stop_name -> stop_ids)
     stops_dict, name_to_id = read_stops(stops_filename)
-    # Lecture de stop_times.txt => trip_stop_map (trip_id -> liste d'arrêts ordonnés)
-    trip_stop_map = read_stop_times(stop_times_filename)
+    # Lecture de stop_times.txt => colonnes triées par trip, arrêts internés en entiers
+    stop_times = read_stop_times(stop_times_filename)
     # Construction du graphe bidirectionnel
-    graph = build_graph(trip_stop_map)
+    graph = build_graph(stop_times)
 
     # ----------------------------------------------------------------------
     # 2. Définition du départ et de l'arrivée (par nom de gare)
@@ -208,18 +214,19 @@ def main():
     departure_name = "Saverne"
     arrival_name   = "Steinbourg"
 
-    # Vérification que les noms existent dans name_to_id
-    if departure_name not in name_to_id:
+    # Récupération des stop_ids possibles pour ce nom de gare (exact, puis préfixe, puis sous-chaîne)
+    name_index = StationNameIndex(name_to_id)
+    departure_ids = name_index.resolve(departure_name)  # liste de stop_id
+    arrival_ids   = name_index.resolve(arrival_name)    # liste de stop_id
+
+    # Vérification que les noms existent dans stops.txt
+    if not departure_ids:
         print(f"Le nom de gare '{departure_name}' n'existe pas dans stops.txt.")
         return
-    if arrival_name not in name_to_id:
+    if not arrival_ids:
         print(f"Le nom de gare '{arrival_name}' n'existe pas dans stops.txt.")
         return
 
-    # Récupération des stop_ids possibles pour ce nom de gare
-    departure_ids = name_to_id[departure_name]  # liste de stop_id
-    arrival_ids   = name_to_id[arrival_name]    # liste de stop_id
-
     # On ne va gérer qu'un seul stop_id départ et un seul stop_id arrivée
     departure_id = departure_ids[0]
     arrival_id   = arrival_ids[0]
@@ -230,7 +237,7 @@ def main():
     # ----------------------------------------------------------------------
     # 3. Recherche du plus court chemin (BFS)
     # ----------------------------------------------------------------------
-    path = bfs_shortest_path(graph, departure_id, arrival_id)
+    path = bfs_shortest_path(graph, stop_times.stops.get(departure_id), stop_times.stops.get(arrival_id))
 
     if path is None:
         print(f"Aucun itinéraire trouvé entre '{departure_name}' et '{arrival_name}'.")
@@ -239,6 +246,8 @@ def main():
     # ----------------------------------------------------------------------
     # 4. Affichage du résultat
     # ----------------------------------------------------------------------
+    # Retour aux stop_id seulement pour l'affichage
+    path = [stop_times.stops[i] for i in path]
     print("Itinéraire trouvé (en stop_id) :", " -> ".join(path))
 
     # Conversion en noms de gares pour un affichage lisible
@@ -249,12 +258,12 @@ def main():
     # 5. Création de la carte avec Folium (visualisation)
     # ----------------------------------------------------------------------
     # stops_dict, name_to_id, stop_coords = read_stops_map(stops_filename)
-    # trip_stop_map = read_stop_times(stop_times_filename)
+    # stop_times = read_stop_times(stop_times_filename)
     # # Graphe
-    # graph = build_graph(trip_stop_map)
+    # graph = build_graph(stop_times)
 
     # # Construction de la carte
-    # folium_map = create_map(stop_coords, graph, stops_dict)
+    # folium_map = create_map(stop_coords, graph, stops_dict, stop_times.stops)
 
     # # Sauvegarde dans un fichier HTML
     # folium_map.save("sncf_map.html")
@@ -8,6 +8,8 @@ url = "https://eu.ftp.opendatasoft.com/sncf/plandata/export-ter-gtfs-last.zip"
 temp_dir = "./temp_sncf"
 temp_file = os.path.join(temp_dir, "sncf_data.zip")
 dest_dir = "./dataSncf"
+# Les fichiers GTFS sont lus directement dans l'archive (voir app/gtfs_source.py)
+dest_archive = dest_dir + ".zip"
 
 os.makedirs(temp_dir, exist_ok=True)
 
@@ -22,15 +24,12 @@ else:
     exit(1)
 
 if zipfile.is_zipfile(temp_file):
-    print("Extraction des fichiers...")
-    with zipfile.ZipFile(temp_file, "r") as zip_ref:
-        # Supprimer l'ancien dossier dataSncf
-        if os.path.exists(dest_dir):
-            shutil.rmtree(dest_dir)
-        # Extraire dans le dossier de destination
-        os.makedirs(dest_dir, exist_ok=True)
-        zip_ref.extractall(dest_dir)
-    print(f"Fichiers extraits dans {dest_dir}.")
+    print("Remplacement de l'archive...")
+    os.replace(temp_file, dest_archive)
+    # Supprimer l'ancien dossier dataSncf : les fichiers extraits masqueraient la nouvelle archive
+    if os.path.exists(dest_dir):
+        shutil.rmtree(dest_dir)
+    print(f"Archive enregistrée dans {dest_archive}.")
 else:
     print("Le fichier téléchargé n'est pas une archive ZIP.")
 
@@ -1,15 +1,21 @@
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch.nn.functional as F
+import os
 
 # Load the saved model and tokenizer
 model_path = './target/fine-tuned-bert'
 tokenizer = AutoTokenizer.from_pretrained(model_path)
 model = AutoModelForSequenceClassification.from_pretrained(model_path)
 
-# Move the model to the appropriate device
-device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
-model = model.to(device)
+# TRIP_CLASSIFIER_BACKEND=int8 : couches linéaires quantifiées en int8 (CPU), comme dans l'application
+if os.environ.get('TRIP_CLASSIFIER_BACKEND', 'fp32') == 'int8':
+    device = torch.device('cpu')
+    model = torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+else:
+    # Move the model to the appropriate device
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    model = model.to(device)
 
 def predict_phrase_label(phrase):
     inputs = tokenizer(